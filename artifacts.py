@@ -0,0 +1,121 @@
+"""Writes exported files only when their content changes.
+
+Each export is serialized in memory and compared with the existing file. A
+    changed file is atomically replaced, so readers never see a partial
+    export and unchanged files keep their modification time. The paths of
+    changed and removed files are recorded until they are collected with
+    take_changed.
+"""
+
+import hashlib
+import os
+import os.path
+import stat
+import tempfile
+import threading
+from typing import List
+
+import pandas as pd
+
+_changed = []
+_changed_lock = threading.Lock()
+# The umask can only be read by setting it, so it is read once on import
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _record(path: str):
+    with _changed_lock:
+        _changed.append(path)
+
+
+def take_changed() -> List[str]:
+    """The files changed since the last call, in the order written."""
+    with _changed_lock:
+        changed = _changed.copy()
+        _changed.clear()
+    return changed
+
+
+def _same_content(path: str, data: bytes) -> bool:
+    if not os.path.isfile(path) or os.path.getsize(path) != len(data):
+        return False
+    with open(path, 'rb') as f:
+        existing = f.read()
+    return (hashlib.sha1(existing).digest()
+            == hashlib.sha1(data).digest())
+
+
+def _temp_path(path: str) -> str:
+    """A new file next to path, so it can replace path atomically. It has
+        the mode of path, or the mode of a newly created file if path does
+        not exist, rather than the owner only mode of temporary files.
+    """
+    fd, temp = tempfile.mkstemp(
+        prefix=f'.{os.path.basename(path)}.', dir=os.path.dirname(path)
+    )
+    try:
+        if os.path.isfile(path):
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        else:
+            mode = 0o666 & ~_UMASK
+        os.fchmod(fd, mode)
+    finally:
+        os.close(fd)
+    return temp
+
+
+def write_bytes(path: str, data: bytes) -> bool:
+    """Replaces a file with data unless it already holds data.
+    Returns:
+        Whether the file changed.
+    """
+    if _same_content(path, data):
+        return False
+    temp = _temp_path(path)
+    try:
+        with open(temp, 'wb') as f:
+            f.write(data)
+        os.replace(temp, path)
+    except BaseException:
+        os.remove(temp)
+        raise
+    _record(path)
+    return True
+
+
+def remove(path: str) -> bool:
+    """Removes a file which is no longer exported.
+    Returns:
+        Whether the file existed.
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    _record(path)
+    return True
+
+
+def replace(src: str, path: str) -> bool:
+    """Moves src over path, like os.replace. If path already holds the same
+        content, src is removed and path keeps its modification time.
+    Returns:
+        Whether path changed.
+    """
+    with open(src, 'rb') as f:
+        same = _same_content(path, f.read())
+    if same:
+        os.remove(src)
+        return False
+    os.replace(src, path)
+    _record(path)
+    return True
+
+
+def to_csv(df: pd.DataFrame, path: str, **kwargs) -> bool:
+    """Exports a DataFrame with DataFrame.to_csv if the CSV changed.
+    Returns:
+        Whether the file changed.
+    """
+    return write_bytes(path, df.to_csv(**kwargs).encode())
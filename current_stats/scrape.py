@@ -3,9 +3,10 @@ import os.path
 import bs4
 import numpy as np
 import pandas as pd
-import requests
 
 import lac_covid19.const as const
+from lac_covid19.http_cache import (NOT_MODIFIED, conditional_get,
+                                    load_validators, save_validators)
 
 PAGE_URL = 'http://publichealth.lacounty.gov/media/Coronavirus/locations.htm'
 PAGE_HTML = os.path.join(os.path.dirname(__file__), 'locations.htm')
@@ -21,20 +22,31 @@ ID_VACCINATED = 'vaccinated'
 OBS = 'Obs'
 
 
-def fetch_page(cached=True):
+def fetch_page(cached=True, if_modified=False):
     """Fetches the 'Locations & Demographics' page from LACDPH
     Args:
         cached: Indicates if a local cached version should be tried before
             requesting the website online.
+        if_modified: When requesting the website online, return None if the
+            page has not changed since it was last cached.
     Returns: A BeautifulSoup object representing the page.
     """
-    if cached and os.path.isfile(PAGE_HTML):
+    page_cached = os.path.isfile(PAGE_HTML)
+    if cached and page_cached:
+        with open(PAGE_HTML) as f:
+            return bs4.BeautifulSoup(f.read(), 'html.parser')
+    r = conditional_get(
+        PAGE_URL, load_validators(PAGE_HTML) if page_cached else {}
+    )
+    if r.status_code == NOT_MODIFIED:
+        if if_modified:
+            return None
         with open(PAGE_HTML) as f:
             return bs4.BeautifulSoup(f.read(), 'html.parser')
-    r = requests.get(PAGE_URL)
     if r.status_code == 200:
         with open(PAGE_HTML, 'w') as f:
             f.write(r.text)
+        save_validators(PAGE_HTML, r)
         return bs4.BeautifulSoup(r.text, 'html.parser')
     raise ConnectionError('Non 200 HTTP Code while requesting LACDPH page')
 
@@ -228,8 +240,14 @@ def parse_education(html):
     return parse_outbreaks(html, ID_EDUCATION)
 
 
-def query_live(cached=False):
-    page_html = fetch_page(cached)
+def query_live(cached=False, if_modified=False):
+    """Parses every table of the 'Locations & Demographics' page. If
+        if_modified is set and the page is unchanged since it was last
+        fetched, None is returned without parsing anything.
+    """
+    page_html = fetch_page(cached, if_modified)
+    if page_html is None:
+        return None
     df_csa_total = parse_csa(page_html)
     df_health_dept = parse_health_dept(page_html)
     return {
@@ -0,0 +1,172 @@
+"""Runs a graph of tasks concurrently in dependency order.
+
+Each task names the tasks whose results are its arguments and the files it
+    writes. Tasks start as soon as their inputs are done, so network bound
+    tasks overlap with CPU bound ones. The content hash of the inputs of
+    every task which writes files is saved with the hash of each file, and
+    the task is skipped on the next run if neither changed.
+"""
+
+from collections.abc import Mapping
+from concurrent.futures import (FIRST_COMPLETED, Future, ThreadPoolExecutor,
+                                wait)
+import hashlib
+import json
+import os.path
+import pickle
+from typing import Any, Callable, Dict, NamedTuple, Optional, Set, Tuple
+
+import pandas as pd
+
+
+class Task(NamedTuple):
+    """A step of a task graph.
+
+    Attributes:
+        func: Called with the results of the input tasks in order.
+        inputs: The names of the tasks whose results are the arguments.
+        files: The files written by the task. A directory stands for every
+            file in it. A task with files which is not the input of another
+            task can be skipped.
+    """
+    func: Callable
+    inputs: Tuple[str, ...] = ()
+    files: Tuple[str, ...] = ()
+
+
+def content_hash(value) -> str:
+    """Hashes the content of a task result. DataFrames are hashed by their
+        values, mappings by the hashes of their items.
+    """
+    if isinstance(value, pd.DataFrame):
+        content = (
+            repr((list(value.columns), value.dtypes.astype('str').tolist())),
+            pd.util.hash_pandas_object(value).to_numpy().tobytes(),
+        )
+    elif isinstance(value, Mapping):
+        content = sorted((repr(x), content_hash(y)) for x, y in value.items())
+    elif value is None or isinstance(value, (str, int, float)):
+        content = repr(value)
+    else:
+        return hashlib.sha1(pickle.dumps(value)).hexdigest()
+    return hashlib.sha1(repr(content).encode()).hexdigest()
+
+
+def _file_hash(path: str) -> Optional[str]:
+    if os.path.isdir(path):
+        return content_hash({x: _file_hash(os.path.join(path, x))
+                             for x in os.listdir(path)})
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def load_state(path: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """Reads the input and file hashes of the last run of each task."""
+    if path is None or not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _run_task(task: Task, args, state: Optional[Dict[str, Any]],
+              skippable: bool):
+    """Runs a task unless it can be skipped.
+
+    Returns:
+        The result, or None if skipped, and the hashes of the run, or None if
+            the task is not skippable.
+    """
+    if not skippable:
+        return task.func(*args), None
+    inputs_hash = content_hash(dict(zip(task.inputs, args)))
+    if (state is not None and state['inputs'] == inputs_hash
+            and all(_file_hash(x) == y for x, y in state['files'].items())):
+        return None, state
+    result = task.func(*args)
+    return result, {'inputs': inputs_hash,
+                    'files': {x: _file_hash(x) for x in task.files}}
+
+
+def _skippable(tasks: Dict[str, Task]) -> Set[str]:
+    """Checks every input names a task and finds the tasks which can be
+        skipped.
+    """
+    for name, task in tasks.items():
+        missing = set(task.inputs) - set(tasks)
+        if missing:
+            raise KeyError(f"{name} depends on {', '.join(sorted(missing))}")
+    depended_on = {x for task in tasks.values() for x in task.inputs}
+    return {x for x, y in tasks.items() if y.files} - depended_on
+
+
+def _submit_ready(executor: ThreadPoolExecutor, pending: Dict[str, Task],
+                  results: Dict[str, Any], state: Dict[str, Dict[str, Any]],
+                  skippable: Set[str]) -> Dict[Future, str]:
+    """Starts every pending task whose inputs are done.
+
+    Returns:
+        Maps the future of each started task to its name.
+    """
+    started = {}
+    for name, task in list(pending.items()):
+        if not all(x in results for x in task.inputs):
+            continue
+        del pending[name]
+        started[executor.submit(
+            _run_task, task, [results[x] for x in task.inputs],
+            state.get(name), name in skippable
+        )] = name
+    return started
+
+
+def _record_result(name: str, future: Future, results: Dict[str, Any],
+                   state: Dict[str, Dict[str, Any]]) -> None:
+    """Saves the result and hashes of a finished task."""
+    result, task_state = future.result()
+    if task_state is None:
+        results[name] = result
+    elif task_state is state.get(name):
+        print(f'Unchanged, skipped {name}')
+    else:
+        state[name] = task_state
+        results[name] = result
+
+
+def run(tasks: Dict[str, Task], jobs: Optional[int] = None,
+        state_path: Optional[str] = None) -> Dict[str, Any]:
+    """Runs every task once its inputs are done.
+
+    Args:
+        tasks: Maps the name of each task to the task.
+        jobs: The maximum number of tasks run at once in a thread pool.
+        state_path: Where the hashes of each run are saved. If None, no task
+            is skipped.
+
+    Returns:
+        The result of each task which ran. Skipped tasks are left out.
+    """
+    skippable = _skippable(tasks)
+    state = load_state(state_path)
+    results, pending, running = {}, dict(tasks), {}
+
+    with ThreadPoolExecutor(jobs) as executor:
+        while pending or running:
+            running.update(
+                _submit_ready(executor, pending, results, state, skippable)
+            )
+            if not running:
+                if pending:
+                    raise ValueError(
+                        f"Cyclic tasks: {', '.join(sorted(pending))}"
+                    )
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                _record_result(running.pop(future), future, results, state)
+
+    if state_path is not None:
+        with open(state_path, 'w') as f:
+            json.dump(state, f, indent=2)
+    return results
@@ -1 +1,2 @@
-from lac_covid19.daily_pr.access import query_date, query_all
+from lac_covid19.daily_pr.access import (query_date, query_all,
+                                          iter_press_releases)
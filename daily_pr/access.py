@@ -1,111 +1,299 @@
-from copy import deepcopy
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed)
+import hashlib
 import os.path
-import datetime as dt
-import json
+import re
+import threading
+import time
+from urllib.parse import urlsplit
 
 import bs4
 import requests
-import re
-import pickle
-import numpy as np
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from lac_covid19.const.columns import NEW_CASES, NEW_DEATHS
 from lac_covid19.daily_pr.prid import PRID
-from lac_covid19.daily_pr.parse import parse_pr
+from lac_covid19.daily_pr.parse import parse_pr, PARSER_VERSION
+from lac_covid19.daily_pr.html_text import html_to_text
+from lac_covid19.daily_pr.html_archive import HtmlArchive
 from lac_covid19.daily_pr.paths import *
-from lac_covid19.const import DATE, AREA, JSON_COMPACT
+from lac_covid19.daily_pr.store import (FINGERPRINT_KEYS, HTML_STAT,
+                                        PressReleaseStore)
+from lac_covid19.http_cache import (NOT_MODIFIED, conditional_get,
+                                    load_validators, save_validators)
+from lac_covid19.const import DATE, AREA
 from lac_covid19.daily_pr.bad_data import HARDCODE_DATE_AREA, SUBSTITUE_SORUCE, DATA_TYPOS
-
-_PICKLE_CACHE = os.path.join(DIR_PICKLE, 'parsed.pickle')
+import lac_covid19.daily_pr.bad_data as bad_data
 
 _LACDPH_PR_URL = 'http://www.publichealth.lacounty.gov/phcommon/public/media/mediapubhpdetail.cfm?prid={}'  # pylint: disable=line-too-long
 
+FETCH_JOBS = 8
+FETCH_RATE_LIMIT = 0.25  # Minimum seconds between requests to a single host
+FETCH_RETRIES = 3
+FETCH_BACKOFF = 0.5
+_RETRY_STATUS = (429, 500, 502, 503, 504)
+
+# Extract press release text with html_text instead of BeautifulSoup
+FAST_TEXT = False
+
+
+_archive = None
+
 
 def _html_path(date):
     return os.path.join(DIR_HTML, f'{date}.html')
 
 
-def _json_path(date):
-    return os.path.join(DIR_JSON, f'{date}.json')
+def _get_archive():
+    """The packed html archive, which is empty until pages are imported."""
+    global _archive
+    if _archive is None:
+        _archive = HtmlArchive(memory_map=True)
+    return _archive
 
 
-def _fetch_html(date):
-    """Fetches the webpage online and returns the html source as text."""
-    # Fix for June 27, 2021 press release overwrite
-    if date == '2021-06-27':
-        with open(_html_path(date)) as f:
+def _is_cached(date):
+    return date in _get_archive() or os.path.isfile(_html_path(date))
+
+
+def _read_cached_html(date):
+    """Reads a cached webpage from the archive, falling back to the html
+        cache directory. Returns None if the page is not cached.
+    """
+    if date in _get_archive():
+        return _get_archive().get(date)
+    date_html = _html_path(date)
+    if os.path.isfile(date_html):
+        with open(date_html) as f:
             return f.read()
+    return None
 
-    date_prid = PRID.get(date)
-    if date_prid is None:
-        raise ValueError(f'No Press Release ID for {date_prid}')
-    r = requests.get(_LACDPH_PR_URL.format(date_prid))
-    if r.status_code == 200:
+
+def _cache_html(pages):
+    """Saves fetched webpages to the html cache directory, and to the archive
+        if one is in use.
+    """
+    for date, html in pages.items():
         with open(_html_path(date), 'w') as f:
-            f.write(r.text)
-            return r.text
+            f.write(html)
+    if os.path.isfile(HTML_PACK_INDEX):
+        _get_archive().put_many({x: y.encode() for x, y in pages.items()})
+
+
+def _host_rate_limiter(min_interval):
+    """Spaces out requests made to the same host across threads.
+    Returns:
+        A function to call with the URL before each request, which waits
+            until the host can be requested again.
+    """
+    lock = threading.Lock()
+    next_slot = {}
+
+    def wait(url):
+        host = urlsplit(url).netloc
+        with lock:
+            now = time.monotonic()
+            slot = max(now, next_slot.get(host, now))
+            next_slot[host] = slot + min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    return wait
+
+
+def create_session(pool_size=FETCH_JOBS, retries=FETCH_RETRIES,
+                   backoff=FETCH_BACKOFF):
+    """Creates a keep-alive HTTP session which retries failed requests with
+        exponential backoff.
+    """
+    adapter = HTTPAdapter(
+        pool_connections=1, pool_maxsize=pool_size,
+        max_retries=Retry(total=retries, backoff_factor=backoff,
+                          status_forcelist=_RETRY_STATUS)
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _request_html(prid, session=None, url_template=_LACDPH_PR_URL,
+                  rate_limiter=None, validators=None):
+    """Requests a single press release by PRID.
+    Args:
+        validators: Saved response headers of a cached copy of the page. If
+            given, the request is conditional on the page having changed.
+    Returns:
+        The response, which is either the page or NOT_MODIFIED.
+    """
+    url = url_template.format(prid)
+    if rate_limiter is not None:
+        rate_limiter(url)
+    r = conditional_get(url, validators or {}, session)
+    if r.status_code in (200, NOT_MODIFIED):
+        return r
     raise requests.exceptions.ConnectionError(
-        f'Cannot get press release for {date}'
+        f'Cannot get press release {prid}'
     )
 
 
-def load_html(date, cache=True):
-    """Loads the webpage and makes small edits defined in bad_data."""
-    raw_html = None
-    date_html = _html_path(date)
-    if cache and os.path.isfile(date_html):
-        with open(date_html) as f:
-            raw_html = f.read()
-    else:
+def _fetch_html_if_modified(date, session=None, url_template=_LACDPH_PR_URL):
+    """Fetches the webpage online unless the cached copy is still current.
+    Returns:
+        The html source as text, or None if the cached webpage is unchanged.
+    """
+    # Fix for June 27, 2021 press release overwrite
+    if date == '2021-06-27':
+        return None
+
+    date_prid = PRID.get(date)
+    if date_prid is None:
+        raise ValueError(f'No Press Release ID for {date}')
+    validators = load_validators(_html_path(date)) if _is_cached(date) else {}
+    try:
+        r = _request_html(date_prid, session, url_template,
+                          validators=validators)
+    except requests.exceptions.ConnectionError as e:
+        raise requests.exceptions.ConnectionError(
+            f'Cannot get press release for {date}'
+        ) from e
+    if r.status_code == NOT_MODIFIED:
+        return None
+    _cache_html({date: r.text})
+    save_validators(_html_path(date), r)
+    return r.text
+
+
+def _fetch_html(date, session=None, url_template=_LACDPH_PR_URL):
+    """Fetches the webpage online and returns the html source as text."""
+    html = _fetch_html_if_modified(date, session, url_template)
+    if html is None:
+        return _read_cached_html(date)
+    return html
+
+
+def _store_response(dates, r, cache=True):
+    """Maps the dates sharing a PRID to the page of the response, and
+        caches the page and its validators for each date.
+    """
+    pages = dict.fromkeys(dates, r.text)
+    if cache:
+        _cache_html(pages)
+        for date in dates:
+            save_validators(_html_path(date), r)
+    return pages
+
+
+def fetch_many_html(dates, jobs=FETCH_JOBS, url_template=_LACDPH_PR_URL,
+                    rate_limit=FETCH_RATE_LIMIT, cache=True):
+    """Downloads many press releases concurrently and caches them to disk.
+        Each page is cached as soon as it is downloaded, so a failed request
+        does not lose the pages already downloaded.
+    Args:
+        dates: Dates formatted in ISO 8601 YYYY-MM-DD to download.
+        jobs: The maximum number of simultaneous requests.
+        url_template: A URL with a single format field for the PRID. This can
+            point to a local server serving cached pages for testing.
+        rate_limit: Minimum number of seconds between requests to one host.
+        cache: Saves the downloaded pages to the html cache.
+    Returns:
+        A dictionary mapping each date to its html source.
+    Raises:
+        requests.exceptions.ConnectionError: Listing every date which could
+            not be downloaded, after the other dates are downloaded.
+    """
+    output = {}
+    dates_by_prid = {}
+    for date in dates:
+        # Fix for June 27, 2021 press release overwrite
+        if date == '2021-06-27':
+            if _is_cached(date):
+                output[date] = _read_cached_html(date)
+            continue
+        if date not in PRID:
+            raise ValueError(f'No Press Release ID for {date}')
+        dates_by_prid.setdefault(PRID[date], []).append(date)
+
+    rate_limiter = _host_rate_limiter(rate_limit)
+    failed = []
+    with create_session(jobs) as session:
+        with ThreadPoolExecutor(jobs) as executor:
+            # Maps each request to the dates sharing its PRID
+            futures = {
+                executor.submit(_request_html, x, session, url_template,
+                                rate_limiter): y
+                for x, y in dates_by_prid.items()
+            }
+            for future in as_completed(futures):
+                try:
+                    output.update(_store_response(futures[future],
+                                                  future.result(), cache))
+                except requests.exceptions.RequestException as e:
+                    print(f"Cannot get press release for "
+                          f"{', '.join(futures[future])}: {e}")
+                    failed.extend(futures[future])
+    if failed:
+        raise requests.exceptions.ConnectionError(
+            f"Cannot get press releases for {', '.join(sorted(failed))}"
+        )
+    return output
+
+
+def load_html(date, cache=True, fast_text=None, raw_html=None):
+    """Loads the webpage and makes small edits defined in bad_data.
+    Args:
+        date: A specified date formated in ISO 8601 YYYY-MM-DD
+        cache: Tries to read a cached webpage first
+        fast_text: Extracts the text with the streaming extractor instead of
+            BeautifulSoup. Defaults to FAST_TEXT.
+        raw_html: The webpage source, if it has already been read.
+    Returns:
+        The text of the press release.
+    """
+    if raw_html is None and cache:
+        raw_html = _read_cached_html(date)
+    if raw_html is None:
         raw_html = _fetch_html(date)
     if date in SUBSTITUE_SORUCE:
         for swap_instructions in SUBSTITUE_SORUCE[date]:
             raw_html = re.sub(swap_instructions[0], swap_instructions[1],
                               raw_html)
+    if FAST_TEXT if fast_text is None else fast_text:
+        return html_to_text(raw_html)
     return bs4.BeautifulSoup(raw_html, 'html.parser').get_text()
 
 
-def _write_json(pr_dict):
-    pr_dict = deepcopy(pr_dict)
-    pr_dict[DATE] = pr_dict[DATE].isoformat()
-    if pr_dict[NEW_CASES] is np.nan:
-        pr_dict[NEW_CASES] = None
-    if pr_dict[NEW_DEATHS] is np.nan:
-        pr_dict[NEW_DEATHS] = None
-    with open(_json_path(pr_dict[DATE]), 'w') as f:
-        json.dump(pr_dict, f, separators=JSON_COMPACT)
-
-
-def _load_json(date):
-    date_json = _json_path(date)
-    if os.path.isfile(date_json):
-        pr_dict = None
-        with open(date_json) as f:
-            pr_dict = json.load(f)
-        pr_dict[DATE] = dt.date.fromisoformat(pr_dict[DATE])
-        if pr_dict[NEW_CASES] is None:
-            pr_dict[NEW_CASES] = np.nan
-        if pr_dict[NEW_DEATHS] is None:
-            pr_dict[NEW_DEATHS] = np.nan
-        for i in range(len(pr_dict[AREA])):
-            pr_dict[AREA][i] = tuple(pr_dict[AREA][i])
-        pr_dict[AREA] = tuple(pr_dict[AREA])
-        return pr_dict
-
-
-def query_date(date, json_cache=True, html_cache=True):
+def query_date(date, json_cache=True, html_cache=True, store=None):
     """Queries a single press release
     Args:
         date: A specified date formated in ISO 8601 YYYY-MM-DD
-        json_cache: Tries to read a cached parsed json first
-        html_cache: Tries to read a cached webpage first
+        json_cache: Tries to read an already parsed press release from the
+            store first
+        html_cache: Tries to read a cached webpage first. Otherwise the webpage
+            is requested conditionally, and an unchanged webpage is treated as
+            if it were read from the cache.
+        store: The PressReleaseStore holding parsed press releases.
     Returns:
         A dictionary of data from a press release.
     """
-    pr = _load_json(date)
-    if html_cache and json_cache and pr:
-        return pr
-    pr = parse_pr(load_html(date, html_cache))
+    if store is None:
+        store = PressReleaseStore()
+    raw_html = None
+    if not html_cache:
+        raw_html = _fetch_html_if_modified(date)
+        html_cache = raw_html is None
+    if html_cache and json_cache:
+        pr = store.releases(date, date)
+        if pr:
+            return pr[0]
+    pr = _parse_date(date, html_cache, raw_html)
+    store.append((pr,), {date: _fingerprint(date)})
+    return pr
+
+
+def _parse_date(date, html_cache=True, raw_html=None):
+    """Parses a press release from html and applies bad_data corrections."""
+    pr = parse_pr(load_html(date, html_cache, raw_html=raw_html))
     assert date == pr[DATE].isoformat()
     if date in DATA_TYPOS:
         for correction in DATA_TYPOS[date]:
@@ -121,26 +309,171 @@ def query_date(date, json_cache=True, html_cache=True):
             if area in area_index_map:
                 pr_area[i] = substitutions[area_index_map[area]]
         pr[AREA] = tuple(pr_area)
-    _write_json(pr)
     return pr
 
 
-def query_all(pickle_cache=True, json_cache=True):
+def parse_many(dates, jobs=None, html_cache=True):
+    """Parses many press releases from html, bypassing the store.
+    Args:
+        dates: Dates formatted in ISO 8601 YYYY-MM-DD to parse.
+        jobs: If greater than one, press releases are parsed across a pool
+            of this many processes. Webpages which need to be fetched are
+            fetched first in this process.
+        html_cache: Tries to read a cached webpage first
+    Returns:
+        A list of parsed press releases in the same order as dates.
+    """
+    dates = list(dates)
+    # Read archived pages in one sequential pass
+    pages = _get_archive().read_many(dates) if html_cache else {}
+    raw_html = [pages.get(x) for x in dates]
+    if jobs is None or jobs < 2 or len(dates) < 2:
+        return list(map(_parse_date, dates, [html_cache] * len(dates),
+                        raw_html))
+    # Each process has its own copy of the archive index, so processes only
+    # parse and never write fetched pages to the cache
+    if html_cache:
+        missing = [x for x, y in zip(dates, raw_html)
+                   if y is None and not _is_cached(x)]
+        fetched = fetch_many_html(missing) if missing else {}
+    else:
+        fetched = {x: _fetch_html(x) for x in dates}
+    raw_html = [fetched.get(x, y) for x, y in zip(dates, raw_html)]
+    with ProcessPoolExecutor(jobs) as executor:
+        return list(executor.map(
+            _parse_date, dates, [html_cache] * len(dates), raw_html,
+            chunksize=max(1, len(dates) // (4 * jobs))
+        ))
+
+
+def _corrections_hash(date):
+    """Hashes every bad_data correction which applies to a single date."""
+    corrections = (
+        SUBSTITUE_SORUCE.get(date), DATA_TYPOS.get(date),
+        HARDCODE_DATE_AREA.get(date),
+        bad_data.HARDCODE_NEW_CASES_DEATHS.get(date),
+        str(bad_data.CORR_FACILITY_RECORDED),
+    )
+    return hashlib.sha1(repr(corrections).encode()).hexdigest()
+
+
+def _fingerprint(date, stored=None):
+    """Identifies the inputs which produce a parsed press release. A cached
+        parse is valid only if the fingerprint is unchanged.
+    Args:
+        stored: The fingerprint the date was stored with. If its html file
+            has the same size and modification time, the stored hash is
+            reused instead of reading the file.
+    """
+    # Archived pages are keyed by the same hash
+    html_hash = _get_archive().content_hash(date)
+    html_stat = None
+    date_html = _html_path(date)
+    if html_hash is None and os.path.isfile(date_html):
+        stat = os.stat(date_html)
+        html_stat = f'{stat.st_size}:{stat.st_mtime_ns}'
+        if stored is not None and stored.get(HTML_STAT) == html_stat:
+            html_hash = stored['html']
+        else:
+            with open(date_html, 'rb') as f:
+                html_hash = hashlib.sha1(f.read()).hexdigest()
+    return {
+        'html': html_hash,
+        'parser': PARSER_VERSION,
+        'corrections': _corrections_hash(date),
+        HTML_STAT: html_stat,
+    }
+
+
+def _is_current(stored, fingerprint):
+    """Whether a press release was stored from the same inputs."""
+    return (stored is not None and bool(stored['html'])
+            and all(stored[x] == fingerprint[x] for x in FINGERPRINT_KEYS))
+
+
+def _date_range(start=None, end=None):
+    """Lists the press release dates between two dates (inclusive)."""
+    start, end = [None if x is None else str(x)[:10] for x in (start, end)]
+    return sorted(x for x in PRID if (start is None or x >= start)
+                  and (end is None or x <= end))
+
+
+def update_store(cache=True, fetch_jobs=None, jobs=None, store=None,
+                 dates=None):
+    """Brings the store of parsed press releases up to date.
+
+    Each press release is stored with a fingerprint of the hash of its html,
+    the parser version, and the bad_data corrections for its date. Only new
+    dates and dates whose fingerprint changed are parsed again.
+
+    Args:
+        cache: Reuses already parsed press releases with an unchanged
+            fingerprint. If False, every press release is parsed again.
+        fetch_jobs: If given, press releases missing from the html cache are
+            first downloaded concurrently with this many requests at once.
+        jobs: If greater than one, press releases needing to be parsed are
+            spread across a pool of this many processes.
+        store: The PressReleaseStore to update.
+        dates: Only brings these dates up to date. Defaults to every press
+            release.
+    Returns:
+        The updated PressReleaseStore.
+    """
+    if store is None:
+        store = PressReleaseStore()
+    if dates is None:
+        dates = PRID
+    if fetch_jobs:
+        fetch_many_html(
+            [x for x in dates if not _is_cached(x)],
+            fetch_jobs
+        )
+    stored = store.fingerprints(html_stat=True) if cache else {}
+    fingerprints = {x: _fingerprint(x, stored.get(x)) for x in dates}
+    stale = [x for x in dates
+             if not _is_current(stored.get(x), fingerprints[x])]
+    if stale:
+        store.append(parse_many(stale, jobs),
+                     {x: fingerprints[x] for x in stale})
+    return store
+
+
+def query_all(cache=True, fetch_jobs=None, jobs=None):
     """Queries all press releases.
     Args:
-        pickle_cache: Tries to load a python pickle file to avoid needing to
-            read through all the json files.
-        json_cache: Tries to read already parsed json's of press releases.
+        cache: Reuses already parsed press releases from the store. If False,
+            every press release is parsed again.
+        fetch_jobs: If given, press releases missing from the html cache are
+            first downloaded concurrently with this many requests at once.
+        jobs: If greater than one, press releases needing to be parsed are
+            spread across a pool of this many processes.
     Returns:
-        A list of python dictonaries of parsed json.
+        A list of python dictonaries of parsed press releases.
+    """
+    return update_store(cache, fetch_jobs, jobs).releases()
+
+
+def iter_press_releases(start=None, end=None, *, cache=True, fetch_jobs=None,
+                        jobs=None, store=None):
+    """Lazily yields the press releases between two dates in order. Only the
+        press releases within the bounds are fetched, parsed, or read.
+    Args:
+        start: The first date to yield, formatted in ISO 8601 YYYY-MM-DD.
+            Defaults to the first press release.
+        end: The last date to yield. Defaults to the latest press release.
+        cache: Reuses already parsed press releases from the store. If False,
+            every press release within the bounds is parsed again.
+        fetch_jobs: If given, press releases missing from the html cache are
+            first downloaded concurrently with this many requests at once.
+        jobs: If greater than one, press releases needing to be parsed are
+            spread across a pool of this many processes.
+        store: The PressReleaseStore holding parsed press releases.
+    Yields:
+        Python dictionaries of parsed press releases.
     """
-    if pickle_cache and json_cache and os.path.isfile(_PICKLE_CACHE):
-        with open(_PICKLE_CACHE, 'rb') as f:
-            return pickle.load(f)
-    data = [query_date(x, json_cache) for x in PRID]
-    with open(_PICKLE_CACHE, 'wb') as f:
-        pickle.dump(data, f)
-    return data
+    store = update_store(cache, fetch_jobs, jobs, store,
+                         _date_range(start, end))
+    yield from store.iter_releases(start, end)
 
 
 if __name__ == "__main__":
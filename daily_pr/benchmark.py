@@ -0,0 +1,273 @@
+"""Times the press release pipeline against the cached html corpus."""
+
+import datetime as dt
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import math
+import os
+import os.path
+import threading
+import time
+import tracemalloc
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+import lac_covid19.const as const
+from lac_covid19.daily_pr.prid import PRID
+from lac_covid19.daily_pr.paths import DIR_HTML
+from lac_covid19.daily_pr.parse import parse_pr
+import lac_covid19.daily_pr.access as access
+import lac_covid19.daily_pr.time_series as time_series
+import lac_covid19.registry as registry
+
+
+def cached_dates():
+    """Dates with a press release in the html cache, in PRID order."""
+    return [x for x in PRID
+            if os.path.isfile(os.path.join(DIR_HTML, f'{x}.html'))]
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _profiled(func, *args, **kwargs):
+    """Runs a function and measures its time and peak traced memory."""
+    tracemalloc.start()
+    try:
+        result, elapsed = _timed(func, *args, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def _repeat_history(many_daily_pr, times):
+    """Synthesizes a longer history by repeating press releases with their
+        dates shifted past the end of the previous repetition.
+    """
+    span = (many_daily_pr[-1][const.DATE] - many_daily_pr[0][const.DATE]
+            + dt.timedelta(days=1))
+    return [{**x, const.DATE: x[const.DATE] + i * span}
+            for i in range(times) for x in many_daily_pr]
+
+
+def _same_parse(x, y):
+    """Compares parsed press releases, treating missing values as equal.
+        A NaN unpickled from another process is not the same object as the
+        NaN it was pickled from, so == fails on it.
+    """
+    if isinstance(x, float) and isinstance(y, float):
+        return x == y or (math.isnan(x) and math.isnan(y))
+    if isinstance(x, dict) and isinstance(y, dict):
+        return (list(x) == list(y)
+                and all(_same_parse(x[k], y[k]) for k in x))
+    if isinstance(x, (list, tuple)) and isinstance(y, (list, tuple)):
+        return (type(x) is type(y) and len(x) == len(y)
+                and all(map(_same_parse, x, y)))
+    return x == y
+
+
+def parallel_parse(jobs=os.cpu_count()):
+    """Compares serial and process pool parsing of the cached corpus."""
+    dates = cached_dates()
+    serial, serial_time = _timed(access.parse_many, dates)
+    parallel, parallel_time = _timed(access.parse_many, dates, jobs)
+    assert _same_parse(serial, parallel), \
+        'Parallel parse differs from serial parse'
+    print(f'Parsed {len(dates)} press releases: '
+          f'serial {serial_time:.2f}s / {jobs} jobs {parallel_time:.2f}s '
+          f'({serial_time / parallel_time:.1f}x)')
+
+
+def _serve_pages(pages):
+    """Starts a local stand-in for the press release server in a thread.
+    Args:
+        pages: Maps each PRID to the html served for it.
+    Returns:
+        The server and a URL template for access.fetch_many_html.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        """Serves a page by the PRID in its query string."""
+
+        def do_GET(self):
+            prid = parse_qs(urlsplit(self.path).query).get('prid', [''])[0]
+            if prid not in pages:
+                self.send_error(404)
+                return
+            body = pages[prid].encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}/?prid={{}}'
+
+
+def local_fetch(dates=None, jobs=access.FETCH_JOBS):
+    """Fetches the cached corpus concurrently from a local stand-in server,
+        without writing to the html cache, and compares the pages fetched
+        with the pages served.
+    Returns:
+        The dates whose fetched page differs from the cached page.
+    """
+    if dates is None:
+        dates = cached_dates()
+    pages = {str(PRID[x]): access._read_cached_html(x) for x in dates}
+    server, url_template = _serve_pages(pages)
+    try:
+        fetched, elapsed = _timed(access.fetch_many_html, dates, jobs,
+                                  url_template, 0, cache=False)
+    finally:
+        server.shutdown()
+        server.server_close()
+    mismatched = [x for x in dates
+                  if fetched.get(x) != access._read_cached_html(x)]
+    print(f'Fetched {len(dates)} press releases from a local server with '
+          f'{jobs} jobs: {elapsed:.2f}s')
+    if mismatched:
+        print(f"Fetched pages differ: {', '.join(mismatched)}")
+    return mismatched
+
+
+def text_extractors(dates=None):
+    """Diffs parse_pr output between BeautifulSoup and the streaming text
+        extractor on the cached corpus.
+    Returns:
+        The dates whose parsed output differs between extractors.
+    """
+    if dates is None:
+        dates = cached_dates()
+    bs4_time = fast_time = 0
+    mismatched = []
+    for date in dates:
+        bs4_text, elapsed = _timed(access.load_html, date, fast_text=False)
+        bs4_time += elapsed
+        fast_text, elapsed = _timed(access.load_html, date, fast_text=True)
+        fast_time += elapsed
+        if parse_pr(bs4_text) != parse_pr(fast_text):
+            mismatched.append(date)
+    print(f'Extracted {len(dates)} press releases: '
+          f'BeautifulSoup {bs4_time:.2f}s / streaming {fast_time:.2f}s')
+    if mismatched:
+        print(f"Parsed output differs: {', '.join(mismatched)}")
+    return mismatched
+
+
+def section_segmenter(dates=None, repeat=5):
+    """Compares parse_pr with the single pass section segmenter against a
+        search per section on the cached corpus.
+    Returns:
+        The dates whose parsed output differs between the two modes.
+    """
+    if dates is None:
+        dates = cached_dates()
+    texts = [access.load_html(x) for x in dates]
+    search_time = single_pass_time = 0
+    mismatched = []
+    for date, pr_txt in zip(dates, texts):
+        for _ in range(repeat):
+            search, elapsed = _timed(parse_pr, pr_txt, single_pass=False)
+            search_time += elapsed
+            single_pass, elapsed = _timed(parse_pr, pr_txt, single_pass=True)
+            single_pass_time += elapsed
+        if search != single_pass:
+            mismatched.append(date)
+    print(f'Parsed {len(dates)} press releases {repeat} times: '
+          f'per section search {search_time:.2f}s / '
+          f'single pass {single_pass_time:.2f}s')
+    if mismatched:
+        print(f"Parsed output differs: {', '.join(mismatched)}")
+    return mismatched
+
+
+def incremental_ts(new_days=1):
+    """Compares appending the latest days to the time series against a full
+        rebuild of every stored press release.
+    Returns:
+        The names of the time series which differ between the two.
+    """
+    many_daily_pr = access.update_store().releases()
+    older = many_daily_pr[:-new_days]
+    full, full_time = _timed(time_series._build_all_ts, many_daily_pr)
+    appended, append_time = _timed(
+        time_series.append_all_ts, time_series._build_all_ts(older),
+        many_daily_pr
+    )
+    if appended is None:
+        print('Active areas changed, a full rebuild is required')
+        return list(full)
+    mismatched = []
+    for key in full:
+        try:
+            pd.testing.assert_frame_equal(full[key], appended[key])
+        except AssertionError:
+            mismatched.append(key)
+    print(f'Built time series with {new_days} new days: '
+          f'full rebuild {full_time:.2f}s / append {append_time:.2f}s')
+    if mismatched:
+        print(f"Appended time series differ: {', '.join(mismatched)}")
+    return mismatched
+
+
+def area_construction(scales=(1, 10)):
+    """Compares building the area time series from a DataFrame per press
+        release against building it from flat columns.
+    Args:
+        scales: Multiples of the stored history to build from.
+    """
+    many_daily_pr = access.update_store().releases()
+    for scale in scales:
+        history = _repeat_history(many_daily_pr, scale)
+        per_day, per_day_time, per_day_peak = _profiled(
+            lambda x: pd.concat(map(time_series.single_day_area, x),
+                                ignore_index=True),
+            history
+        )
+        flat, flat_time, flat_peak = _profiled(time_series.area_ts, history)
+        pd.testing.assert_frame_equal(
+            per_day, flat.astype({const.AREA: 'object'})
+        )
+        print(f'Area series from {len(history)} press releases: '
+              f'per day {per_day_time:.2f}s {per_day_peak / 2**20:.1f}MiB / '
+              f'flat {flat_time:.2f}s {flat_peak / 2**20:.1f}MiB')
+
+
+def categorical_identifiers(scale=10):
+    """Compares the memory and the sort and region lookup times of area names
+        stored as strings against registered categories.
+    Args:
+        scale: Multiple of the stored history to build from.
+    """
+    df = time_series.area_ts(
+        _repeat_history(access.update_store().releases(), scale)
+    )
+    df_str = df.astype({const.AREA: 'object'})
+    region_map = dict(zip(registry.AREAS,
+                          registry.area_regions(registry.AREAS)))
+    for label, df_ids, lookup in (
+            ('strings', df_str, lambda x: x.map(region_map)),
+            ('categories', df, registry.area_regions)):
+        memory = df_ids[const.AREA].memory_usage(deep=True)
+        _, sort_time = _timed(df_ids.sort_values, [const.DATE, const.AREA])
+        _, region_time = _timed(lookup, df_ids[const.AREA])
+        print(f'{len(df_ids)} areas as {label}: {memory / 2**20:.1f}MiB, '
+              f'sort {sort_time:.2f}s, region lookup {region_time:.3f}s')
+
+
+if __name__ == "__main__":
+    local_fetch()
+    parallel_parse()
+    text_extractors()
+    section_segmenter()
+    incremental_ts()
+    area_construction()
+    categorical_identifiers()
@@ -0,0 +1,245 @@
+"""Vectorized time series calculations for many groups at once.
+
+A long format time series is pivoted once into dense date by group matrices
+    covering every calendar day. Daily changes, rolling averages, and per
+    capita rates are then computed as whole matrix operations and the results
+    are read back in long format.
+"""
+
+from typing import Dict, Iterable, Mapping, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import sparse
+
+import lac_covid19.const as const
+
+
+class Dense(NamedTuple):
+    """A long format time series as date by group matrices.
+
+    Attributes:
+        dates: Every calendar day from the first date to the last.
+        groups: The groups in sorted order, or in category order when the
+            groups are categorical.
+        values: Maps each value column to its matrix. Dates a group was not
+            reported are forward filled from the last report.
+        rows: Marks the cells which are rows in long format.
+    """
+    dates: pd.DatetimeIndex
+    groups: pd.Index
+    values: Dict[str, np.ndarray]
+    rows: np.ndarray
+
+
+def ffill(matrix: np.ndarray) -> np.ndarray:
+    """Forward fills missing values of each column."""
+    valid = ~np.isnan(matrix)
+    last_valid = np.maximum.accumulate(
+        np.where(valid, np.arange(len(matrix))[:, np.newaxis], 0), axis=0
+    )
+    filled = matrix[last_valid, np.arange(matrix.shape[1])]
+    filled[~np.maximum.accumulate(valid, axis=0)] = np.nan
+    return filled
+
+
+def span(reported: np.ndarray) -> np.ndarray:
+    """Marks the dates from the first to the last report of each column."""
+    return (np.maximum.accumulate(reported, axis=0)
+            & np.maximum.accumulate(reported[::-1], axis=0)[::-1])
+
+
+def _index_groups(column: pd.Series):
+    """The groups in a column and the position of each entry's group."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # Keep the category order and index by code
+        codes = column.cat.codes.to_numpy()
+        present = np.unique(codes[codes >= 0])
+        groups = pd.CategoricalIndex(
+            pd.Categorical.from_codes(present, dtype=column.dtype)
+        )
+        lookup = np.full(len(column.cat.categories), -1)
+        lookup[present] = np.arange(len(present))
+        return groups, lookup[codes]
+    groups = pd.Index(sorted(column.unique()))
+    return groups, groups.get_indexer(column)
+
+
+def to_dense(df: pd.DataFrame, date_col: str, group_col: str,
+             value_cols: Sequence[str], fill_dates: bool = True) -> Dense:
+    """Pivots a long format time series into date by group matrices.
+
+    Args:
+        df: A time series with one entry per date and group.
+        date_col: The column of dates.
+        group_col: The column of groups.
+        value_cols: The columns to pivot.
+        fill_dates: Include missing dates between the first and last report
+            of a group as rows. Otherwise, only the reported entries are rows.
+
+    Returns:
+        The dense time series.
+    """
+    entry_dates = pd.DatetimeIndex(df[date_col])
+    dates = pd.date_range(entry_dates.min(), entry_dates.max())
+    groups, j = _index_groups(df[group_col])
+    i = dates.get_indexer(entry_dates)
+
+    reported = np.zeros((len(dates), len(groups)), dtype=bool)
+    reported[i, j] = True
+    values = {}
+    for col in value_cols:
+        matrix = np.full(reported.shape, np.nan)
+        matrix[i, j] = df[col].to_numpy(dtype='float', na_value=np.nan)
+        values[col] = ffill(matrix)
+
+    return Dense(dates, groups, values,
+                 span(reported) if fill_dates else reported)
+
+
+def entry_cells(rows: np.ndarray):
+    """Packs the rows of each group to the top of a matrix, so calculations
+        down a column span the entries of the group rather than calendar days.
+
+    Args:
+        rows: Marks the cells of a Dense which are rows in long format.
+
+    Returns:
+        The matrix row and column of each long format row, in long format
+            order.
+    """
+    i, j = np.nonzero(rows)
+    return (np.cumsum(rows, axis=0) - 1)[i, j], j
+
+
+def daily_change(matrix: np.ndarray) -> np.ndarray:
+    """The change of each column from the previous date."""
+    change = np.full_like(matrix, np.nan)
+    change[1:] = matrix[1:] - matrix[:-1]
+    return change
+
+
+def rolling_mean(matrix: np.ndarray, window: int) -> np.ndarray:
+    """The trailing mean of each column. A mean is missing unless every date
+        in its window has a value.
+    """
+    mean = np.full_like(matrix, np.nan)
+    if len(matrix) >= window:
+        mean[window-1:] = (
+            sliding_window_view(matrix, window, axis=0).sum(axis=-1) / window
+        )
+    return mean
+
+
+def per_capita(values, population):
+    """Scales values to a rate per RATE_SCALE people."""
+    return values / population * const.RATE_SCALE
+
+
+def group_populations(groups: Iterable,
+                      population_mapper: Mapping) -> np.ndarray:
+    """The population of each group, missing for unknown groups."""
+    return np.array([population_mapper.get(x, np.nan) for x in groups],
+                    dtype='float')
+
+
+def to_long(dense: Dense, date_col: str, group_col: str,
+            columns: Mapping[str, np.ndarray]) -> pd.DataFrame:
+    """Reads date by group matrices back into a long format time series
+        sorted by date and then group.
+    """
+    i, j = np.nonzero(dense.rows)
+    return pd.DataFrame({
+        date_col: dense.dates[i],
+        group_col: dense.groups[j],
+        **{col: matrix[i, j] for col, matrix in columns.items()},
+    })
+
+
+def membership_matrix(regions: Mapping[str, Iterable[str]],
+                      groups: Sequence[str]) -> sparse.csr_matrix:
+    """A sparse matrix with a row for each region and a column for each group,
+        which is one where the group is a member of the region. Members which
+        are not among the groups are ignored.
+    """
+    group_index = {x: i for i, x in enumerate(groups)}
+    rows, cols = [], []
+    for i, members in enumerate(regions.values()):
+        member_index = {group_index.get(x) for x in members} - {None}
+        rows.extend([i] * len(member_index))
+        cols.extend(member_index)
+    return sparse.csr_matrix((np.ones(len(rows)), (rows, cols)),
+                             shape=(len(regions), len(groups)))
+
+
+class Columns(NamedTuple):
+    """The columns computed from a cumulative variable. Columns left as None
+        are not computed.
+
+    Attributes:
+        var: The cumulative variable.
+        var_dt: The daily change of the variable.
+        var_dt_avg: The rolling average of the daily change.
+        var_norm: The variable per capita.
+        var_dt_norm_avg: The rolling average of the daily change per capita.
+        avg_window: The number of days in the rolling average.
+    """
+    var: str
+    var_dt: Optional[str] = None
+    var_dt_avg: Optional[str] = None
+    var_norm: Optional[str] = None
+    var_dt_norm_avg: Optional[str] = None
+    avg_window: int = 14
+
+
+def compute_columns(var: np.ndarray, columns: Columns,
+                    populations: Optional[np.ndarray] = None
+                    ) -> Dict[str, np.ndarray]:
+    """Computes the columns of compute_all_groups from a date by group
+        matrix of a cumulative variable and the population of each group.
+    """
+    var_dt = daily_change(var)
+    var_dt_avg = rolling_mean(var_dt, columns.avg_window)
+    computed = {columns.var: var}
+    if columns.var_dt is not None:
+        computed[columns.var_dt] = var_dt
+    if columns.var_dt_avg is not None:
+        computed[columns.var_dt_avg] = var_dt_avg.round(1)
+    if columns.var_norm is not None:
+        computed[columns.var_norm] = per_capita(var, populations).round(1)
+    if columns.var_dt_norm_avg is not None:
+        computed[columns.var_dt_norm_avg] = (
+            per_capita(var_dt_avg, populations).round(2)
+        )
+    return computed
+
+
+def compute_all_groups(df: pd.DataFrame, date_col: str, group_col: str,
+                       columns: Columns,
+                       population_mapper: Optional[Mapping] = None, *,
+                       exclude_groups: Optional[Iterable] = None
+                       ) -> pd.DataFrame:
+    """Computes the daily change, its rolling average, and per capita rates
+        of a cumulative variable for every group.
+
+    Missing dates are forward filled, so the rolling average spans calendar
+        days.
+
+    Args:
+        df: A long format time series of date, group, and variable.
+        columns: The variable and the columns to compute from it.
+        population_mapper: Maps each group to its population.
+        exclude_groups: Groups to leave out.
+
+    Returns:
+        Time series DataFrame sorted by date and group.
+    """
+    if exclude_groups is not None:
+        df = df[~df[group_col].isin(exclude_groups)]
+    dense = to_dense(df, date_col, group_col, (columns.var,))
+    populations = (None if population_mapper is None
+                   else group_populations(dense.groups, population_mapper))
+    return to_long(dense, date_col, group_col, compute_columns(
+        dense.values[columns.var], columns, populations
+    ))
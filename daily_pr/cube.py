@@ -0,0 +1,146 @@
+"""A dense date by area by metric array of the area time series.
+
+The array is saved as a .npy file which is memory mapped when loaded, so
+    notebooks and exports can share one copy of the area time series and
+    look up values by position instead of filtering a long DataFrame.
+"""
+
+import json
+import os.path
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+import lac_covid19.const as const
+from lac_covid19.daily_pr.paths import DIR_PICKLE
+
+CUBE_PATH = os.path.join(DIR_PICKLE, 'area-cube.npy')
+
+METRICS = (const.CASES, const.CASES_PER_CAPITA, const.NEW_CASES,
+           const.NEW_CASES_14_DAY_AVG, const.NEW_CASES_14_DAY_AVG_PER_CAPITA)
+
+
+def _index_path(path: str) -> str:
+    return f'{os.path.splitext(path)[0]}.json'
+
+
+CUBE_INDEX_PATH = _index_path(CUBE_PATH)
+
+
+class Cube:
+    """Values of the area time series indexed by [date, area, metric].
+
+    Dates are every calendar day from the first to the last, so a date is
+        found by its offset from the first. Entries which were not published
+        are missing.
+
+    Args:
+        data: An array of shape (dates, areas, metrics).
+        start: The first date.
+        areas: The areas in the order of the second axis.
+        metrics: The metrics in the order of the third axis.
+    """
+
+    def __init__(self, data: np.ndarray, start: pd.Timestamp,
+                 areas: Sequence[str], metrics: Sequence[str] = METRICS):
+        self.data = data
+        self.start = pd.Timestamp(start)
+        self.areas = tuple(areas)
+        self.metrics = tuple(metrics)
+        self._area_index = {x: i for i, x in enumerate(self.areas)}
+        self._metric_index = {x: i for i, x in enumerate(self.metrics)}
+
+    @classmethod
+    def from_area_ts(cls, df_area: pd.DataFrame,
+                     path: Optional[str] = CUBE_PATH) -> 'Cube':
+        """Builds a cube from the area time series.
+
+        Args:
+            df_area: Time series from time_series.create_by_area.
+            path: Where to save the cube. If None, the cube is kept in memory.
+        """
+        dates = pd.DatetimeIndex(df_area[const.DATE])
+        start = dates.min()
+        areas = sorted(df_area[const.AREA].unique())
+        shape = ((dates.max() - start).days + 1, len(areas), len(METRICS))
+        if path is None:
+            data = np.full(shape, np.nan)
+        else:
+            data = np.lib.format.open_memmap(path, 'w+', 'float', shape)
+            data[:] = np.nan
+        i = (dates - start).days
+        j = pd.Index(areas).get_indexer(df_area[const.AREA])
+        for k, metric in enumerate(METRICS):
+            data[i, j, k] = df_area[metric].to_numpy('float', na_value=np.nan)
+        cube = cls(data, start, areas)
+        if path is not None:
+            data.flush()
+            with open(_index_path(path), 'w') as f:
+                json.dump({'start': start.isoformat()[:10], 'areas': areas,
+                           'metrics': METRICS}, f)
+        return cube
+
+    @classmethod
+    def load(cls, path: str = CUBE_PATH, mode: str = 'r') -> 'Cube':
+        """Memory maps a saved cube. Use mode 'r+' to modify it in place."""
+        with open(_index_path(path)) as f:
+            index = json.load(f)
+        return cls(np.load(path, mmap_mode=mode), index['start'],
+                   index['areas'], index['metrics'])
+
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        return pd.date_range(self.start, periods=len(self.data))
+
+    def _date_offset(self, date) -> int:
+        offset = (pd.Timestamp(date) - self.start).days
+        if not 0 <= offset < len(self.data):
+            raise KeyError(date)
+        return offset
+
+    def _date_slice(self, start=None, end=None) -> slice:
+        """Positions of the dates between two dates (inclusive)."""
+        first = (0 if start is None
+                 else max((pd.Timestamp(start) - self.start).days, 0))
+        last = (len(self.data) if end is None
+                else (pd.Timestamp(end) - self.start).days + 1)
+        return slice(first, max(last, first))
+
+    def value(self, date, area: str, metric: str) -> float:
+        """Looks up a single value."""
+        return self.data[self._date_offset(date), self._area_index[area],
+                         self._metric_index[metric]]
+
+    def area(self, area: str, start=None, end=None) -> pd.DataFrame:
+        """Time series of a single area between two dates (inclusive).
+
+        Returns:
+            DataFrame indexed by date with a column for each metric.
+        """
+        dates = self._date_slice(start, end)
+        return pd.DataFrame(self.data[dates, self._area_index[area]],
+                            index=self.dates[dates], columns=self.metrics)
+
+    def date(self, date) -> pd.DataFrame:
+        """Every area on a single date.
+
+        Returns:
+            DataFrame indexed by area with a column for each metric.
+        """
+        return pd.DataFrame(self.data[self._date_offset(date)],
+                            index=self.areas, columns=self.metrics)
+
+    def metric(self, metric: str, start=None, end=None) -> pd.DataFrame:
+        """A single metric between two dates (inclusive).
+
+        Returns:
+            DataFrame indexed by date with a column for each area.
+        """
+        dates = self._date_slice(start, end)
+        return pd.DataFrame(self.data[dates, :, self._metric_index[metric]],
+                            index=self.dates[dates], columns=self.areas)
+
+    def interval(self, start=None, end=None) -> np.ndarray:
+        """A view of every area and metric between two dates (inclusive)."""
+        return self.data[self._date_slice(start, end)]
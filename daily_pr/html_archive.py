@@ -0,0 +1,163 @@
+"""A packed, compressed alternative to the one file per day html cache.
+
+Pages are stored once each, keyed by the SHA-1 of their contents, as zlib
+    compressed blobs appended to a single pack file. A JSON index maps each
+    blob to its offset and length in the pack and each date to a blob, so
+    identical pages are only stored once and reading the whole history is a
+    single pass through one file.
+
+Usage:
+    python -m lac_covid19.daily_pr.html_archive import [directory]
+    python -m lac_covid19.daily_pr.html_archive export [directory]
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import os.path
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+from lac_covid19.daily_pr.paths import DIR_HTML, HTML_PACK, HTML_PACK_INDEX
+
+BLOBS = 'blobs'
+DATES = 'dates'
+
+
+def _decode(raw: bytes) -> str:
+    """Decodes a page the same way as reading the file in text mode."""
+    return raw.decode().replace('\r\n', '\n').replace('\r', '\n')
+
+
+class HtmlArchive:
+    """A content addressed pack of press release pages.
+
+    Args:
+        pack_path: The file holding the compressed pages.
+        index_path: The JSON index of the pack.
+        memory_map: Reads the pack through a memory map rather than seeking
+            within the file for each page.
+    """
+
+    def __init__(self, pack_path: str = HTML_PACK,
+                 index_path: str = HTML_PACK_INDEX, memory_map: bool = False):
+        self.pack_path = pack_path
+        self.index_path = index_path
+        self.memory_map = memory_map
+        self._index = {BLOBS: {}, DATES: {}}
+        if os.path.isfile(index_path):
+            with open(index_path) as f:
+                self._index = json.load(f)
+
+    def __contains__(self, date: str) -> bool:
+        return date in self._index[DATES]
+
+    def dates(self) -> List[str]:
+        """Lists the dates with a page in the archive."""
+        return sorted(self._index[DATES])
+
+    def content_hash(self, date: str) -> Optional[str]:
+        """The SHA-1 of a date's page, which is also its key in the pack."""
+        return self._index[DATES].get(date)
+
+    def _write_index(self):
+        temp_path = f'{self.index_path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self._index, f, separators=(',', ':'), sort_keys=True)
+        os.replace(temp_path, self.index_path)
+
+    def put_many(self, pages: Dict[str, bytes]):
+        """Adds pages to the archive. Pages already stored under another date
+            are not stored again.
+
+        Args:
+            pages: Maps each date to the raw bytes of its page.
+        """
+        if not pages:
+            return
+        blobs = self._index[BLOBS]
+        with open(self.pack_path, 'ab') as f:
+            for date, raw in pages.items():
+                key = hashlib.sha1(raw).hexdigest()
+                if key not in blobs:
+                    compressed = zlib.compress(raw, 9)
+                    blobs[key] = (f.tell(), len(compressed))
+                    f.write(compressed)
+                self._index[DATES][date] = key
+        self._write_index()
+
+    def put(self, date: str, html: str):
+        self.put_many({date: html.encode()})
+
+    def read_many(self, dates: Iterable[str]) -> Dict[str, str]:
+        """Reads pages in the order they are laid out in the pack, so reading
+            the entire history is one sequential pass.
+
+        Returns:
+            A dictionary mapping each date found in the archive to its page.
+        """
+        keys = {x: self._index[DATES][x] for x in dates
+                if x in self._index[DATES]}
+        if not keys:
+            return {}
+        blobs = self._index[BLOBS]
+        pages = {}
+        with open(self.pack_path, 'rb') as f:
+            pack = (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    if self.memory_map else None)
+            for key in sorted(set(keys.values()), key=lambda x: blobs[x][0]):
+                offset, length = blobs[key]
+                if pack is None:
+                    f.seek(offset)
+                    compressed = f.read(length)
+                else:
+                    compressed = pack[offset:offset + length]
+                pages[key] = _decode(zlib.decompress(compressed))
+            if pack is not None:
+                pack.close()
+        return {date: pages[key] for date, key in keys.items()}
+
+    def get(self, date: str) -> Optional[str]:
+        """Reads a single date's page, or None if it is not archived."""
+        return self.read_many((date,)).get(date)
+
+
+def import_directory(directory: str = DIR_HTML,
+                     archive: Optional[HtmlArchive] = None) -> HtmlArchive:
+    """Packs every page of an html cache directory into the archive."""
+    if archive is None:
+        archive = HtmlArchive()
+    pages = {}
+    for filename in sorted(os.listdir(directory)):
+        date, extension = os.path.splitext(filename)
+        if extension == '.html':
+            with open(os.path.join(directory, filename), 'rb') as f:
+                pages[date] = f.read()
+    archive.put_many(pages)
+    return archive
+
+
+def export_directory(directory: str = DIR_HTML,
+                     archive: Optional[HtmlArchive] = None):
+    """Writes every archived page to a directory as one html file per day."""
+    if archive is None:
+        archive = HtmlArchive()
+    os.makedirs(directory, exist_ok=True)
+    for date, html in archive.read_many(archive.dates()).items():
+        with open(os.path.join(directory, f'{date}.html'), 'w') as f:
+            f.write(html)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Converts between the html cache directory and archive.'
+    )
+    parser.add_argument('action', choices=('import', 'export'))
+    parser.add_argument('directory', nargs='?', default=DIR_HTML)
+    args = parser.parse_args()
+    if args.action == 'import':
+        import_directory(args.directory)
+    else:
+        export_directory(args.directory)
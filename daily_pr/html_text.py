@@ -0,0 +1,89 @@
+"""A streaming alternative to BeautifulSoup for extracting the text of a
+    press release.
+
+BeautifulSoup builds an entire document tree only for get_text() to walk it
+    again. The extractor here collects text directly from the tokenizer, while
+    reproducing how BeautifulSoup's html.parser builder treats whitespace so
+    the regular expressions in daily_pr.parse see identical text.
+"""
+
+from html.parser import HTMLParser
+
+# Contents of these tags are not part of the visible text
+_SKIP_TAGS = ('script', 'style', 'template')
+# Whitespace within these tags is kept verbatim
+_PRESERVE_WHITESPACE_TAGS = ('pre', 'textarea')
+_ASCII_SPACES = ' \n\t\x0c\r'
+
+
+class _TextExtractor(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.text = []
+        self._pending = []
+        self._skip_depth = 0
+        self._preserve_depth = 0
+
+    def _flush(self):
+        """Emits the text between two markup tokens as a single string.
+            Whitespace only strings are collapsed to a newline or a space.
+        """
+        if not self._pending:
+            return
+        data = ''.join(self._pending)
+        self._pending = []
+        if not self._preserve_depth and not data.strip(_ASCII_SPACES):
+            data = '\n' if '\n' in data else ' '
+        if not self._skip_depth:
+            self.text.append(data)
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in _PRESERVE_WHITESPACE_TAGS:
+            self._preserve_depth += 1
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag in _SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in _PRESERVE_WHITESPACE_TAGS and self._preserve_depth:
+            self._preserve_depth -= 1
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        # BeautifulSoup keeps the text of CDATA sections as its own string
+        if data.upper().startswith('CDATA['):
+            self._pending.append(data[len('CDATA['):])
+            self._flush()
+
+    def handle_data(self, data):
+        self._pending.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def html_to_text(raw_html: str) -> str:
+    """Extracts the text of an html document as BeautifulSoup get_text()
+        would.
+    """
+    extractor = _TextExtractor()
+    extractor.feed(raw_html)
+    extractor.close()
+    return ''.join(extractor.text)
@@ -4,12 +4,20 @@
 
 import datetime as dt
 import re
-from typing import Any, Dict, Tuple, Optional, Union
+from typing import Any, Dict, Iterable, List, Tuple, Optional, Union
 
 import numpy as np
 
 import lac_covid19.const as const
 import lac_covid19.daily_pr.bad_data as bad_data
+import lac_covid19.registry as registry
+
+# Increment whenever a change to this module alters parsed output, which
+# invalidates every cached parse.
+PARSER_VERSION = 2
+
+# Locate every section in one scan instead of searching per section
+SINGLE_PASS = True
 
 NUMBERS_AS_WORDS = {
     'no': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4,
@@ -51,12 +59,72 @@ RE_RACE_ENTRY = re.compile(
     f"(?P<group>{'|'.join(const.RACE_GROUP)}).+?(?P<count>\d+)\s"
 )
 
-CSA_ENTIRE = re.compile('City\s+of\s+Agoura\s+Hills.+?Under\s+Investigation')
+PATTERN_CSA_HEADER = 'City\s+of\s+Agoura\s+Hills'
+CSA_ENTIRE = re.compile(f'{PATTERN_CSA_HEADER}.+?Under\s+Investigation')
 RE_CSA_ENTRY = re.compile(
     '(?P<csa>City\s+of.+?|Los\s+Angeles(?!,|\sCounty).*?|Unincorporated.+?)'
     '(?P<cfoutbreak>\*?)\s+(?P<cases>\d+|--).+?(?P<case_rate>\d+|--)')
 
 
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Builds a regex pattern matching any of the words, arranged as a prefix
+        tree so the regex engine never backtracks across shared prefixes.
+        Spaces in the words match any run of whitespace.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def branch(node):
+        word_ends = '' in node
+        alternatives = [
+            ('\\s+' if char == ' ' else re.escape(char)) + branch(node[char])
+            for char in sorted(node) if char
+        ]
+        if not alternatives:
+            return ''
+        if len(alternatives) == 1 and not word_ends:
+            return alternatives[0]
+        return f"(?:{'|'.join(alternatives)}){'?' if word_ends else ''}"
+
+    return branch(trie)
+
+
+KNOWN_AREAS = frozenset(registry.AREAS)
+RE_CSA_KNOWN_ENTRY = re.compile(
+    f'(?P<csa>{_trie_pattern(sorted(KNOWN_AREAS))})'
+    '(?P<cfoutbreak>\*?)\s+(?P<cases>\d+|--).+?(?P<case_rate>\d+|--)'
+)
+# Characters expected between two rows of the CSA table
+_CSA_ROW_SEPARATORS = ' \t\n\r\x0c\xa0()'
+
+SECTION_AGE = 'age'
+SECTION_GENDER = 'gender'
+SECTION_RACE_CASES = 'race_cases'
+SECTION_RACE_DEATHS = 'race_deaths'
+SECTION_CSA = 'csa'
+_SECTION_END = 'end'
+_LINE_END = 'eol'
+# Every alternative starts with a distinct literal character, which lets the
+# regex engine skip ahead and identifies which alternative matched. The race
+# cases lookbehind is unnecessary as the deaths header is matched first.
+RE_SECTIONS = re.compile('|'.join((
+    PATTERN_AGE_HEADER, PATTERN_GENDER,
+    'Race/Ethnicity\s+\(Los\s+Angeles', PATTERN_RACE_DEATHS,
+    PATTERN_CSA_HEADER, 'Under\s+Investigation', '\n'
+)))
+_SECTION_FIRST_CHAR = {
+    'A': SECTION_AGE, 'G': SECTION_GENDER, 'R': SECTION_RACE_CASES,
+    'D': SECTION_RACE_DEATHS, 'C': SECTION_CSA, 'U': _SECTION_END,
+    '\n': _LINE_END,
+}
+_ALL_SECTIONS = (SECTION_AGE, SECTION_GENDER, SECTION_RACE_CASES,
+                 SECTION_RACE_DEATHS, SECTION_CSA)
+
+
 def _str_to_int(number: str) -> int:
     """Parses a string to an integer with safegaurds for commas in numerical
         representation.
@@ -74,6 +142,45 @@ def _parse_date(pr_txt: str) -> dt.date:
                                 '%B %d, %Y').date()
 
 
+def _segment(pr_txt: str) -> Dict[str, str]:
+    """Finds every section of the press release in a single scan.
+
+    A section runs from the first occurrence of its header to the nearest
+        "Under Investigation" on the same line, which is the same text the
+        per section searches of _parse_group and CSA_ENTIRE select.
+
+    Returns:
+        A dictionary with the section names as keys and the section text as
+        values. Sections which cannot be found are left out.
+    """
+    sections = {}
+    open_sections = {}
+    for token in RE_SECTIONS.finditer(pr_txt):
+        kind = _SECTION_FIRST_CHAR[token.group()[0]]
+        if kind == _LINE_END:
+            open_sections.clear()
+        elif kind == _SECTION_END:
+            for name, (start, header_end) in list(open_sections.items()):
+                if token.start() > header_end:
+                    sections[name] = pr_txt[start:token.end()]
+                    del open_sections[name]
+            if len(sections) == len(_ALL_SECTIONS):
+                break
+        elif kind not in sections and kind not in open_sections:
+            open_sections[kind] = token.span()
+    return sections
+
+
+def _parse_entries(section_txt: Optional[str],
+                   entry_regex: re.Pattern) -> Dict[str, int]:
+    """Extracts the group counts from the text of a single section."""
+    output = {}
+    if section_txt:
+        for row in entry_regex.finditer(section_txt):
+            output[row.group('group')] = int(row.group('count'))
+    return output
+
+
 def _parse_group(pr_txt: str, header_pattern: str,
                  entry_regex: re.Pattern) -> Dict[str, int]:
     """General function to parse and extract a listing from the press release.
@@ -89,20 +196,18 @@ def _parse_group(pr_txt: str, header_pattern: str,
         A dictionary with keys being the groups in section and values being
         their associated counts.
     """
-    output = {}
     listing = re.search(f'{header_pattern}.+?Under\s+Investigation', pr_txt)
-    if listing:
-        for row in entry_regex.finditer(listing.group()):
-            output[row.group('group')] = int(row.group('count'))
-    return output
+    return _parse_entries(listing.group() if listing else None, entry_regex)
 
 
 def _parse_csa(
-    pr_txt: str
+    pr_txt: str, date: Optional[dt.date] = None, csa_txt: Optional[str] = None
 ) -> Dict[str, Tuple[Optional[int], Optional[int], Optional[bool]]]:
     """Parses the city/community section of the press release.
     Args:
         pr_txt: A string of the press release contents.
+        date: The date of the press release, if already parsed.
+        csa_txt: The city/community section, if already located.
     Returns:
         A dictionary with keys representing the statistical area in question.
         The values are represted in the following tuple.
@@ -111,14 +216,15 @@ def _parse_csa(
             2 - Indicates if there is a correctional facility outbreak.
     """
     output = []
-    cf_recorded = _parse_date(pr_txt) >= bad_data.CORR_FACILITY_RECORDED
-    search_txt = pr_txt
-    csa_txt = CSA_ENTIRE.search(pr_txt)
-    if csa_txt:
-        search_txt = csa_txt.group()
-    for row in RE_CSA_ENTRY.finditer(search_txt):
+    if date is None:
+        date = _parse_date(pr_txt)
+    cf_recorded = date >= bad_data.CORR_FACILITY_RECORDED
+    if csa_txt is None:
+        csa_match = CSA_ENTIRE.search(pr_txt)
+        csa_txt = csa_match.group() if csa_match else pr_txt
+    for area, row in _scan_csa(csa_txt)[0]:
         output.append((
-            row.group('csa').rstrip('*'),  # Remove excessive asterisks
+            area,
             _str_to_int(row.group('cases')),
             _str_to_int(row.group('case_rate')),
             bool(row.group('cfoutbreak')) if cf_recorded else None
@@ -126,15 +232,62 @@ def _parse_csa(
     return output
 
 
-def _get_new_cases_deaths(pr_txt: str) -> Tuple[int, int]:
+def _scan_csa(csa_txt: str) -> Tuple[List[Tuple[str, re.Match]], List[str]]:
+    """Recognizes the rows of the city/community table by their known area
+        names.
+
+    Rows are matched against KNOWN_AREAS. Whenever unrecognized text is left
+        between two rows, that stretch is parsed again with the generic
+        RE_CSA_ENTRY so rows of new or renamed areas are still picked up.
+
+    Returns:
+        A tuple of the rows, each as the area name with its regex match, and
+        the names of areas not found in KNOWN_AREAS.
+    """
+    rows = []
+    unknown = []
+    position = 0
+    known_rows = list(RE_CSA_KNOWN_ENTRY.finditer(csa_txt))
+    for row in known_rows + [None]:
+        end = len(csa_txt) if row is None else row.start()
+        if csa_txt[position:end].strip(_CSA_ROW_SEPARATORS):
+            fallback_end = len(csa_txt) if row is None else row.end()
+            for fallback_row in RE_CSA_ENTRY.finditer(csa_txt, position,
+                                                      fallback_end):
+                # Remove excessive asterisks
+                area = fallback_row.group('csa').rstrip('*')
+                rows.append((area, fallback_row))
+                if area not in KNOWN_AREAS:
+                    unknown.append(area)
+        elif row is not None:
+            rows.append((' '.join(row.group('csa').split()), row))
+        if row is not None:
+            position = row.end()
+    return rows, unknown
+
+
+def unknown_areas(pr_txt: str) -> List[str]:
+    """Lists the areas in the city/community section of the press release
+        which are not in KNOWN_AREAS.
+    """
+    csa_txt = _segment(pr_txt).get(SECTION_CSA, pr_txt)
+    return _scan_csa(csa_txt)[1]
+
+
+def _get_new_cases_deaths(pr_txt: str,
+                          date: Optional[dt.date] = None) -> Tuple[int, int]:
     """Extracts the daily new deaths and cases."""
-    date = _parse_date(pr_txt).isoformat()
+    if date is None:
+        date = _parse_date(pr_txt)
+    date = date.isoformat()
     if date in bad_data.HARDCODE_NEW_CASES_DEATHS.keys():
         return bad_data.HARDCODE_NEW_CASES_DEATHS[date]
 
     deaths, cases = np.nan, np.nan
     result_normal = RE_NEW_DEATHS_CASES_NORMAL.search(pr_txt)
-    result_auto = RE_NEW_DEATHS_CASES_AUTO.search(pr_txt)
+    result_auto = None
+    if not result_normal:
+        result_auto = RE_NEW_DEATHS_CASES_AUTO.search(pr_txt)
     if result_normal:
         deaths = result_normal.group('deaths')
         if deaths in NUMBERS_AS_WORDS.keys():
@@ -186,25 +339,50 @@ def _parse_race_deaths(pr_txt):
     return _parse_group(pr_txt, PATTERN_RACE_DEATHS, RE_RACE_ENTRY)
 
 
-def parse_pr(pr_txt: str) -> Dict[str, Union[dt.date, int, Dict[str, Any]]]:
+def parse_pr(
+    pr_txt: str, single_pass: Optional[bool] = None
+) -> Dict[str, Union[dt.date, int, Dict[str, Any]]]:
     """Parses each section of the daily COVID-19 report and places everything
         in a single object.
+    Args:
+        pr_txt: A string of the press release contents.
+        single_pass: Locates every section with one scan of the press release
+            rather than a search per section. Defaults to SINGLE_PASS.
     """
 
-    new_cases, new_deaths = _get_new_cases_deaths(pr_txt)
+    date = _parse_date(pr_txt)
+    new_cases, new_deaths = _get_new_cases_deaths(pr_txt, date)
     hd_cases_deaths = _parse_hd_cases_deaths(pr_txt)
+    if SINGLE_PASS if single_pass is None else single_pass:
+        sections = _segment(pr_txt)
+        by_age, by_gender, by_race, deaths_by_race = [
+            _parse_entries(sections.get(name), entry_regex)
+            for name, entry_regex in (
+                (SECTION_AGE, RE_AGE_ENTRY),
+                (SECTION_GENDER, RE_GENDER_ENTRY),
+                (SECTION_RACE_CASES, RE_RACE_ENTRY),
+                (SECTION_RACE_DEATHS, RE_RACE_ENTRY),
+            )
+        ]
+        areas = _parse_csa(pr_txt, date, sections.get(SECTION_CSA, pr_txt))
+    else:
+        by_age = _parse_age_cases(pr_txt)
+        by_gender = _parse_gender(pr_txt)
+        by_race = _parse_race_cases(pr_txt)
+        deaths_by_race = _parse_race_deaths(pr_txt)
+        areas = _parse_csa(pr_txt, date)
     return {
-        const.DATE: _parse_date(pr_txt),
+        const.DATE: date,
         const.NEW_CASES: new_cases,
         const.NEW_DEATHS: new_deaths,
         const.HOSPITALIZATIONS: _parse_hospitalizations(pr_txt),
         const.CASES: hd_cases_deaths[const.CASES],
         const.DEATHS: hd_cases_deaths[const.DEATHS],
-        const.CASES_BY_AGE: _parse_age_cases(pr_txt),
-        const.CASES_BY_GENDER: _parse_gender(pr_txt),
-        const.CASES_BY_RACE: _parse_race_cases(pr_txt),
-        const.DEATHS_BY_RACE: _parse_race_deaths(pr_txt),
-        const.AREA: _parse_csa(pr_txt)
+        const.CASES_BY_AGE: by_age,
+        const.CASES_BY_GENDER: by_gender,
+        const.CASES_BY_RACE: by_race,
+        const.DEATHS_BY_RACE: deaths_by_race,
+        const.AREA: areas
     }
 
 
@@ -4,3 +4,8 @@ DIR_HTML, DIR_JSON, DIR_PICKLE = [
     os.path.join(os.path.dirname(__file__), x)
     for x in ('cached-html', 'parsed-json', 'pickle-cache')
 ]
+
+HTML_PACK, HTML_PACK_INDEX = [
+    os.path.join(os.path.dirname(__file__), f'cached-html.{x}')
+    for x in ('pack', 'index.json')
+]
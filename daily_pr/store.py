@@ -0,0 +1,310 @@
+"""A single SQLite file holding every parsed press release.
+
+Each section of a press release is kept in its own table keyed by date, so
+    the time series builders can bulk read a whole section into a DataFrame
+    rather than opening a file per day and flattening dictionaries.
+"""
+
+import os.path
+import sqlite3
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import lac_covid19.const as const
+from lac_covid19.daily_pr.paths import DIR_PICKLE
+
+STORE_PATH = os.path.join(DIR_PICKLE, 'press-releases.sqlite')
+
+GROUP_SECTIONS = (const.CASES_BY_AGE, const.CASES_BY_GENDER,
+                  const.CASES_BY_RACE, const.DEATHS_BY_RACE)
+HEALTH_DEPT_SECTIONS = (const.CASES, const.DEATHS)
+FINGERPRINT_KEYS = ('html', 'parser', 'corrections')
+# Size and modification time of the html file the html hash was read from
+HTML_STAT = 'html_stat'
+# Number of press releases read from the store at once when iterating
+ITER_CHUNK = 30
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS release (
+    date TEXT PRIMARY KEY,
+    new_cases INTEGER,
+    new_deaths INTEGER,
+    hospitalizations INTEGER,
+    html TEXT,
+    parser INTEGER,
+    corrections TEXT,
+    html_stat TEXT
+);
+CREATE TABLE IF NOT EXISTS health_dept (
+    date TEXT, section TEXT, dept TEXT, value INTEGER
+);
+CREATE INDEX IF NOT EXISTS health_dept_date ON health_dept (date);
+CREATE TABLE IF NOT EXISTS demographic (
+    date TEXT, section TEXT, grp TEXT, value INTEGER
+);
+CREATE INDEX IF NOT EXISTS demographic_date ON demographic (date);
+CREATE TABLE IF NOT EXISTS area (
+    date TEXT, area TEXT, cases INTEGER, case_rate INTEGER,
+    cf_outbreak INTEGER
+);
+CREATE INDEX IF NOT EXISTS area_date ON area (date);
+"""
+_SECTION_TABLES = ('release', 'health_dept', 'demographic', 'area')
+
+
+def _nullable(value):
+    """Converts missing numbers to SQL NULL."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return value
+
+
+def _int_or_none(value):
+    return None if pd.isna(value) else int(value)
+
+
+def _release_from_scalars(date: pd.Timestamp, new_cases, new_deaths,
+                          hospitalizations) -> Dict[str, Any]:
+    """Starts a parsed press release from its row of the scalars table. The
+        sections are filled in from the other tables.
+    """
+    return {
+        const.DATE: date.date(),
+        const.NEW_CASES: np.nan if pd.isna(new_cases) else int(new_cases),
+        const.NEW_DEATHS: np.nan if pd.isna(new_deaths) else int(new_deaths),
+        const.HOSPITALIZATIONS: _int_or_none(hospitalizations),
+        **{x: {} for x in HEALTH_DEPT_SECTIONS + GROUP_SECTIONS},
+        const.AREA: [],
+    }
+
+
+def _area_entry(area: str, cases, case_rate, cf_outbreak) -> Tuple:
+    """Converts a row of the areas table to a parsed area entry."""
+    return (area, _int_or_none(cases), _int_or_none(case_rate), cf_outbreak)
+
+
+def _where(start: Optional[str], end: Optional[str],
+           section: Optional[str] = None):
+    """Creates a SQL condition and parameters selecting dates within bounds
+        (inclusive) and optionally a single section.
+    """
+    conditions, params = [], []
+    if start is not None:
+        conditions.append('date >= ?')
+        params.append(str(start)[:10])
+    if end is not None:
+        conditions.append('date <= ?')
+        params.append(str(end)[:10])
+    if section is not None:
+        conditions.append('section = ?')
+        params.append(section)
+    return (f" WHERE {' AND '.join(conditions)}" if conditions else ''), params
+
+
+class PressReleaseStore:
+    """Columnar storage of parsed press releases backed by SQLite.
+
+    Args:
+        path: The location of the SQLite database.
+    """
+
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path)
+        connection.executescript(_SCHEMA)
+        # Stores created before the html stat was recorded
+        columns = {x[1] for x in connection.execute(
+            'PRAGMA table_info(release)'
+        )}
+        if HTML_STAT not in columns:
+            connection.execute(
+                f'ALTER TABLE release ADD COLUMN {HTML_STAT} TEXT'
+            )
+        return connection
+
+    def append(self, many_pr: Iterable[Dict[str, Any]],
+               fingerprints: Optional[Dict[str, Dict[str, Any]]] = None):
+        """Adds parsed press releases, replacing any stored for the same date.
+
+        Args:
+            many_pr: Parsed press releases.
+            fingerprints: Optionally maps a date to the fingerprint of the
+                inputs which produced its press release.
+        """
+        fingerprints = fingerprints or {}
+        with self._connect() as connection:
+            for pr in many_pr:
+                date = pr[const.DATE].isoformat()
+                fingerprint = fingerprints.get(date, {})
+                for table in _SECTION_TABLES:
+                    connection.execute(f'DELETE FROM {table} WHERE date = ?',
+                                       (date,))
+                connection.execute(
+                    'INSERT INTO release VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (date, _nullable(pr[const.NEW_CASES]),
+                     _nullable(pr[const.NEW_DEATHS]),
+                     pr[const.HOSPITALIZATIONS],
+                     *[fingerprint.get(x)
+                       for x in (*FINGERPRINT_KEYS, HTML_STAT)])
+                )
+                connection.executemany(
+                    'INSERT INTO health_dept VALUES (?, ?, ?, ?)',
+                    [(date, section, dept, value)
+                     for section in HEALTH_DEPT_SECTIONS
+                     for dept, value in pr[section].items()]
+                )
+                connection.executemany(
+                    'INSERT INTO demographic VALUES (?, ?, ?, ?)',
+                    [(date, section, group, value)
+                     for section in GROUP_SECTIONS
+                     for group, value in pr[section].items()]
+                )
+                connection.executemany(
+                    'INSERT INTO area VALUES (?, ?, ?, ?, ?)',
+                    [(date, area, cases, case_rate,
+                      None if cf_outbreak is None else int(cf_outbreak))
+                     for area, cases, case_rate, cf_outbreak in pr[const.AREA]]
+                )
+        connection.close()
+
+    def _read(self, query: str, params=()) -> pd.DataFrame:
+        with self._connect() as connection:
+            df = pd.read_sql_query(query, connection, params=params)
+        connection.close()
+        return df
+
+    def dates(self, start: Optional[str] = None,
+              end: Optional[str] = None) -> List[str]:
+        """Lists the stored dates between two dates (inclusive) in order."""
+        where, params = _where(start, end)
+        return self._read(f'SELECT date FROM release{where} ORDER BY date',
+                          params)['date'].to_list()
+
+    def fingerprints(self, html_stat: bool = False
+                     ) -> Dict[str, Dict[str, Any]]:
+        """Maps each stored date to the fingerprint it was stored with.
+        Args:
+            html_stat: Also includes the size and modification time of the
+                html file the fingerprint was made from.
+        """
+        keys = (*FINGERPRINT_KEYS, HTML_STAT) if html_stat else FINGERPRINT_KEYS
+        df = self._read(f"SELECT date, {', '.join(keys)} FROM release")
+        return {
+            row['date']: {x: row[x] for x in keys}
+            for row in df.to_dict('records')
+        }
+
+    def scalars(self, start: Optional[str] = None,
+                end: Optional[str] = None) -> pd.DataFrame:
+        """Time series of the countywide new cases, new deaths, and
+            hospitalizations.
+        """
+        where, params = _where(start, end)
+        df = self._read(
+            'SELECT date, new_cases, new_deaths, hospitalizations '
+            f'FROM release{where} ORDER BY date', params
+        ).rename(columns={
+            'date': const.DATE, 'new_cases': const.NEW_CASES,
+            'new_deaths': const.NEW_DEATHS,
+            'hospitalizations': const.HOSPITALIZATIONS,
+        })
+        df[const.DATE] = pd.to_datetime(df[const.DATE])
+        return df
+
+    def health_dept(self, section: str, start: Optional[str] = None,
+                    end: Optional[str] = None) -> pd.DataFrame:
+        """Time series of cases or deaths by health department.
+
+        Returns:
+            DataFrame with the entries: Date, Health dept, and the section.
+        """
+        where, params = _where(start, end, section)
+        df = self._read(
+            f'SELECT date, dept, value FROM health_dept{where} '
+            'ORDER BY date, dept', params
+        ).rename(columns={'date': const.DATE, 'dept': const.HEALTH_DPET,
+                          'value': section})
+        df[const.DATE] = pd.to_datetime(df[const.DATE])
+        return df
+
+    def groups(self, section: str, start: Optional[str] = None,
+               end: Optional[str] = None) -> pd.DataFrame:
+        """A demographic section with one row per date and a column for each
+            group. Groups not reported on a date are missing.
+        """
+        where, params = _where(start, end, section)
+        df = self._read(
+            f'SELECT date, grp, value FROM demographic{where} ORDER BY rowid',
+            params
+        )
+        groups = list(dict.fromkeys(df['grp']))
+        df = (df.pivot(index='date', columns='grp', values='value')
+              .reindex(columns=groups).sort_index())
+        df.columns.name = None
+        df = df.reset_index().rename(columns={'date': const.DATE})
+        df[const.DATE] = pd.to_datetime(df[const.DATE])
+        return df
+
+    def areas(self, start: Optional[str] = None,
+              end: Optional[str] = None) -> pd.DataFrame:
+        """Time series of cases by countywide statistical area in the order
+            they were published.
+
+        Returns:
+            DataFrame with the entries: Date, Area, Cases, Case Rate, CF
+                Outbreak.
+        """
+        where, params = _where(start, end)
+        df = self._read(
+            'SELECT date, area, cases, case_rate, cf_outbreak '
+            f'FROM area{where} ORDER BY date, rowid', params
+        ).rename(columns={
+            'date': const.DATE, 'area': const.AREA, 'cases': const.CASES,
+            'case_rate': const.CASES_PER_CAPITA,
+            'cf_outbreak': const.CF_OUTBREAK,
+        })
+        df[const.DATE] = pd.to_datetime(df[const.DATE])
+        cf_recorded = df[const.CF_OUTBREAK].notna()
+        df[const.CF_OUTBREAK] = df[const.CF_OUTBREAK].map({1: True, 0: False})
+        if not cf_recorded.all():
+            df[const.CF_OUTBREAK] = (df[const.CF_OUTBREAK].astype('object')
+                                     .where(cf_recorded, None))
+        return df
+
+    def releases(self, start: Optional[str] = None,
+                 end: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Rebuilds the parsed press releases between two dates (inclusive)
+            with one read of each table.
+        """
+        df_scalars = self.scalars(start, end)
+        output = {row[0]: _release_from_scalars(*row)
+                  for row in df_scalars.itertuples(index=False)}
+        where, params = _where(start, end)
+        for table, key_column in (('health_dept', 'dept'),
+                                  ('demographic', 'grp')):
+            for date, section, key, value in self._read(
+                    f'SELECT date, section, {key_column}, value '
+                    f'FROM {table}{where} ORDER BY rowid', params
+            ).itertuples(index=False):
+                output[pd.Timestamp(date)][section][key] = _int_or_none(value)
+        for row in self.areas(start, end).itertuples(index=False):
+            output[row[0]][const.AREA].append(_area_entry(*row[1:]))
+        for pr in output.values():
+            pr[const.AREA] = tuple(pr[const.AREA])
+        return list(output.values())
+
+    def iter_releases(self, start: Optional[str] = None,
+                      end: Optional[str] = None,
+                      chunk_size: int = ITER_CHUNK
+                      ) -> Iterator[Dict[str, Any]]:
+        """Yields the parsed press releases between two dates (inclusive) in
+            order, reading only chunk_size press releases at a time.
+        """
+        dates = self.dates(start, end)
+        for i in range(0, len(dates), chunk_size):
+            chunk = dates[i:i+chunk_size]
+            yield from self.releases(chunk[0], chunk[-1])
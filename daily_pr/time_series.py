@@ -2,8 +2,13 @@
     dataframes.
 """
 
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 import os.path
 import pickle
+import threading
+import time
 from typing import Any, Dict, Iterable, Optional, Sequence, Tuple, Union
 
 import numpy as np
@@ -12,11 +17,14 @@ import pandas as pd
 import covid_tools.calc
 
 import lac_covid19.const as const
+import lac_covid19.daily_pr.bad_data as bad_data
 from lac_covid19.daily_pr.bad_data import (NO_REPORT_DATES,
                                            CORR_FACILITY_RECORDED)
 import lac_covid19.daily_pr.access as access
+import lac_covid19.daily_pr.calc as calc
+from lac_covid19.daily_pr.store import PressReleaseStore
 import lac_covid19.population as population
-from lac_covid19.geo.csa import CSA_REGION_MAP
+import lac_covid19.registry as registry
 from lac_covid19.daily_pr.paths import DIR_PICKLE
 from lac_covid19.daily_pr.bad_data import BAD_DATE_AREA
 
@@ -35,37 +43,77 @@ CF_OUTBREAK = const.CF_OUTBREAK
 
 INT64 = 'Int64'
 
+# Columns computed for the demographic and region time series
+CASE_COLUMNS = calc.Columns(
+    CASES, var_norm=CASE_RATE,
+    var_dt_norm_avg=const.NEW_CASES_14_DAY_AVG_PER_CAPITA
+)
+DEATH_COLUMNS = calc.Columns(
+    DEATHS, var_norm=const.DEATHS_PER_CAPITA,
+    var_dt_norm_avg=const.NEW_DEATHS_14_DAY_AVG_PER_CAPITA
+)
+REGION_COLUMNS = calc.Columns(
+    CASES, const.NEW_CASES, const.NEW_CASES_14_DAY_AVG, CASE_RATE,
+    const.NEW_CASES_14_DAY_AVG_PER_CAPITA
+)
+
 TS_CACHE = os.path.join(DIR_PICKLE, 'time-series.pickle')
+TS_CACHE_DIR = os.path.join(DIR_PICKLE, 'time-series')
+# Increment whenever a change to this module alters the time series, which
+# invalidates the cached time series.
+TS_VERSION = 2
+# Days of press releases recomputed before the new days when appending
+INCREMENTAL_WINDOW = 75
+
+
+def _materialize(many_daily_pr):
+    """Reads an iterator of press releases, such as the one from
+        access.iter_press_releases, into a tuple so that it can be traversed
+        more than once. Sequences and stores are returned as is.
+    """
+    if isinstance(many_daily_pr, (PressReleaseStore, Sequence)):
+        return many_daily_pr
+    return tuple(many_daily_pr)
 
 
 def make_section_ts(daily_pr: Dict, section: str) -> Dict[str, Any]:
     """Extracts a section and appends the corersponding date."""
-    data = daily_pr[section]
-    data[DATE] = pd.to_datetime(daily_pr[DATE])
-    return data
+    return {**daily_pr[section], DATE: pd.to_datetime(daily_pr[DATE])}
 
 
 def make_ts_general(many_daily_pr, dict_key, var_name, value_name):
+    """Long format time series of a demographic section.
+
+    Args:
+        many_daily_pr: Parsed press releases, or a PressReleaseStore to bulk
+            read the section from.
+    """
+    if isinstance(many_daily_pr, PressReleaseStore):
+        df_wide = many_daily_pr.groups(dict_key)
+    else:
+        df_wide = pd.DataFrame(
+            [make_section_ts(x, dict_key) for x in many_daily_pr]
+        )
     return pd.melt(
-        pd.DataFrame([make_section_ts(x, dict_key) for x in many_daily_pr]),
-        id_vars=DATE, var_name=var_name, value_name=value_name
+        df_wide, id_vars=DATE, var_name=var_name, value_name=value_name
     ).sort_values([DATE, var_name]).reset_index(drop=True)
 
 
-AGE_SORT_MAP = {
-    const.AGE_0_17: 0,
-    const.AGE_18_40: 18,
-    const.AGE_41_65: 41,
-    const.AGE_OVER_65: 66,
-    const.AGE_0_4: 0,
-    const.AGE_5_11: 5,
-    const.AGE_12_17: 12,
-    const.AGE_18_29: 18,
-    const.AGE_30_49: 30,
-    const.AGE_50_64: 50,
-    const.AGE_65_79: 65,
-    const.AGE_OVER_80: 81,
-}
+def scalar_ts(many_daily_pr) -> pd.DataFrame:
+    """Time series of the countywide new cases, new deaths, and
+        hospitalizations.
+    """
+    many_daily_pr = _materialize(many_daily_pr)
+    if isinstance(many_daily_pr, PressReleaseStore):
+        return many_daily_pr.scalars()
+    return pd.DataFrame({
+        DATE: [pd.to_datetime(x[DATE]) for x in many_daily_pr],
+        **{y: [x[y] for x in many_daily_pr]
+           for y in (const.NEW_CASES, const.NEW_DEATHS,
+                     const.HOSPITALIZATIONS)}
+    })
+
+
 OLD_GROUPS = (const.AGE_0_17, const.AGE_18_40, const.AGE_41_65,
               const.AGE_OVER_65)
 NEW_GROUPS = (const.AGE_0_4, const.AGE_5_11, const.AGE_12_17, const.AGE_18_29,
@@ -80,16 +128,14 @@ def create_by_age(many_daily_pr: Tuple[Dict[str, Any], ...]) -> pd.DataFrame:
         Time series DataFrame with the entries: Date, Age Group, Cases, Case
             Rate.
     """
-    df = covid_tools.calc.compute_all_groups(
+    df = calc.compute_all_groups(
         make_ts_general(many_daily_pr, const.CASES_BY_AGE,
                         const.AGE_GROUP, const.CASES),
-        DATE, const.CASES, const.AGE_GROUP,
-        var_norm_col=const.CASES_PER_CAPITA,
-        var_dt_norm_avg_col=const.NEW_CASES_14_DAY_AVG_PER_CAPITA,
-        population_mapper=population.AGE
+        DATE, const.AGE_GROUP, CASE_COLUMNS, population.AGE
     )
-    df['age'] = df[const.AGE_GROUP].apply(AGE_SORT_MAP.get)
-    df = df.sort_values([DATE, 'age']).drop(columns='age')
+    df[const.AGE_GROUP] = registry.categorical(df[const.AGE_GROUP],
+                                               registry.AGE_DTYPE)
+    df = df.sort_values([DATE, const.AGE_GROUP])
     df = df[
         (df[const.DATE]<AGE_TRANSITION)&(df[const.AGE_GROUP].isin(OLD_GROUPS))
         |(df[const.DATE]>=AGE_TRANSITION)&(df[const.AGE_GROUP].isin(NEW_GROUPS))
@@ -103,14 +149,14 @@ def create_by_gender(many_daily_pr: Tuple[Dict[str, Any], ...]) -> pd.DataFrame:
     Returns:
         Time series DataFrame with the entries: Date, Gender, Cases, Case Rate.
     """
-    df = covid_tools.calc.compute_all_groups(
+    df = calc.compute_all_groups(
         make_ts_general(many_daily_pr, const.CASES_BY_GENDER,
                         const.GENDER, const.CASES),
-        DATE, const.CASES, const.GENDER,
-        var_norm_col=const.CASES_PER_CAPITA,
-        var_dt_norm_avg_col=const.NEW_CASES_14_DAY_AVG_PER_CAPITA,
-        population_mapper=population.GENDER, exclude_groups=[const.OTHER]
+        DATE, const.GENDER, CASE_COLUMNS, population.GENDER,
+        exclude_groups=[const.OTHER]
     )
+    df[const.GENDER] = registry.categorical(df[const.GENDER],
+                                            registry.GENDER_DTYPE)
     return df.convert_dtypes()
 
 
@@ -122,23 +168,20 @@ def create_by_race(many_daily_pr: Tuple[Dict[str, Any], ...]) -> pd.DataFrame:
             Deaths, Death Rate.
     """
 
-    df_cases = covid_tools.calc.compute_all_groups(
+    df_cases = calc.compute_all_groups(
         make_ts_general(many_daily_pr, const.CASES_BY_RACE,
                         const.RACE, const.CASES),
-        DATE, const.CASES, const.RACE,
-        var_norm_col=const.CASES_PER_CAPITA,
-        var_dt_norm_avg_col=const.NEW_CASES_14_DAY_AVG_PER_CAPITA,
-        population_mapper=population.RACE, exclude_groups=[const.OTHER]
+        DATE, const.RACE, CASE_COLUMNS, population.RACE,
+        exclude_groups=[const.OTHER]
     )
-    df_deaths = covid_tools.calc.compute_all_groups(
+    df_deaths = calc.compute_all_groups(
         make_ts_general(many_daily_pr, const.DEATHS_BY_RACE,
                         const.RACE, const.DEATHS),
-        DATE, const.DEATHS, const.RACE,
-        var_norm_col=const.DEATHS_PER_CAPITA,
-        var_dt_norm_avg_col=const.NEW_DEATHS_14_DAY_AVG_PER_CAPITA,
-        population_mapper=population.RACE, exclude_groups=[const.OTHER]
+        DATE, const.RACE, DEATH_COLUMNS, population.RACE,
+        exclude_groups=[const.OTHER]
     )
     df = pd.merge(df_cases, df_deaths, on=[DATE, const.RACE])
+    df[const.RACE] = registry.categorical(df[const.RACE], registry.RACE_DTYPE)
     return df.convert_dtypes()
 
 
@@ -154,6 +197,33 @@ def single_day_area(daily_pr: Dict[str, Any]) -> pd.DataFrame:
     return df[[DATE, AREA, CASES, CASE_RATE, CF_OUTBREAK]]
 
 
+def area_ts(many_daily_pr) -> pd.DataFrame:
+    """Time series of cases by area as published in each press release.
+
+    Rather than a DataFrame per press release, the areas of every press
+        release are flattened into one set of columns with each date repeated
+        once per area.
+    """
+    if isinstance(many_daily_pr, PressReleaseStore):
+        df = many_daily_pr.areas()
+    else:
+        many_daily_pr = _materialize(many_daily_pr)
+        rows = [y for x in many_daily_pr for y in x[AREA]]
+        dates = np.repeat(
+            pd.to_datetime([x[DATE] for x in many_daily_pr]).values,
+            [len(x[AREA]) for x in many_daily_pr]
+        )
+        if rows:
+            df = pd.DataFrame(rows,
+                              columns=(AREA, CASES, CASE_RATE, CF_OUTBREAK))
+            df.insert(0, DATE, dates)
+        else:
+            df = pd.concat(map(single_day_area, many_daily_pr),
+                           ignore_index=True)
+    df[AREA] = registry.categorical(df[AREA], registry.AREA_DTYPE)
+    return df
+
+
 def detect_active_areas(df_area, days_back=60, min_days=50):
     area_counts = df_area[
         df_area[const.DATE]
@@ -169,18 +239,19 @@ def create_by_area(many_daily_pr: Tuple[Dict[str, Any], ...]) -> pd.DataFrame:
         Time series DataFrame with the entries: Date, Area, Region, Case Rate.
     """
 
-    df_csa = pd.concat(map(single_day_area, many_daily_pr), ignore_index=True)
+    many_daily_pr = _materialize(many_daily_pr)
+    df_csa = area_ts(many_daily_pr)
     df_csa = df_csa[df_csa[const.AREA].isin(detect_active_areas(df_csa))].copy()
 
     df_hd = health_dept_ts(many_daily_pr, const.CASES)
     df_hd = df_hd[df_hd[const.HEALTH_DPET]!=const.hd.LOS_ANGELES_COUNTY].copy()
-    df_hd = covid_tools.calc.normalize_population_groups(
-        df_hd, const.CASES, const.CASES_PER_CAPITA,
-        const.HEALTH_DPET, population.HEALTH_DEPT
-    )
-    df_hd[const.CASES_PER_CAPITA] = df_hd[const.CASES_PER_CAPITA].round(1)
+    df_hd[const.CASES_PER_CAPITA] = calc.per_capita(
+        df_hd[const.CASES], df_hd[const.HEALTH_DPET].map(population.HEALTH_DEPT)
+    ).round(1)
     df_hd.rename(columns={const.HEALTH_DPET: const.AREA}, inplace=True)
-    df_hd[const.AREA] = df_hd[const.AREA].apply(const.hd.HD_CSA_MAP.get)
+    df_hd[const.AREA] = registry.categorical(
+        df_hd[const.AREA].map(const.hd.HD_CSA_MAP), df_csa[AREA].dtype
+    )
     df_hd[CF_OUTBREAK] = df_hd[DATE].apply(
         lambda x: False if x >= CORR_FACILITY_RECORDED else None
     )
@@ -188,71 +259,35 @@ def create_by_area(many_daily_pr: Tuple[Dict[str, Any], ...]) -> pd.DataFrame:
     df = (pd.concat([df_csa, df_hd])
           .sort_values([DATE, AREA]).reset_index(drop=True))
 
+    # Daily changes and averages span the published entries of each area,
+    # which are packed into matrices in the order of df
+    dense = calc.to_dense(df, DATE, AREA, (), fill_dates=False)
+    i, j = calc.entry_cells(dense.rows)
     # Patch for May 27, 2021 backdated cases
-    df_new_cases_unadj = covid_tools.calc.daily_change_groups(
-        df, DATE, const.CASES, const.NEW_CASES, const.AREA
-    )
-    df_new_cases_per100k = covid_tools.calc.daily_change_groups(
-        df, DATE, const.CASES_PER_CAPITA, 'new cases per capita', const.AREA
-    )
-    backdated = pd.to_datetime('2021-05-27')
-    df_new_cases_unadj.loc[
-        df_new_cases_unadj[const.DATE]==backdated,
-        const.NEW_CASES
-    ] = 0
-    df_new_cases_per100k.loc[
-        df_new_cases_per100k[const.DATE]==backdated,
-        'new cases per capita'
-    ] = 0
-
-    # Calculate new cases rolling average
-    df_new_cases_unadj = covid_tools.calc.rolling_avg_groups(
-        df_new_cases_unadj,
-        DATE, const.NEW_CASES, const.NEW_CASES_14_DAY_AVG, 14, const.AREA
-    )
-    # Calculate new cases per capita rolling average
-    df_new_cases_per100k = covid_tools.calc.rolling_avg_groups(
-        df_new_cases_per100k,
-        DATE, 'new cases per capita',
-        const.NEW_CASES_14_DAY_AVG_PER_CAPITA, 14, const.AREA
-    )
-    df = pd.merge(
-        df_new_cases_unadj[[
-            const.DATE,
-            const.AREA,
-            const.CASES,
-            const.CASES_PER_CAPITA,
-            const.CF_OUTBREAK,
-            const.NEW_CASES,
-            const.NEW_CASES_14_DAY_AVG,
-        ]],
-        df_new_cases_per100k[[
-            const.DATE,
-            const.AREA,
-            const.NEW_CASES_14_DAY_AVG_PER_CAPITA,
-        ]],
-        'left',
-        [const.DATE, const.AREA]
-    )
-    df[const.NEW_CASES_14_DAY_AVG] = df[const.NEW_CASES_14_DAY_AVG].round(2)
-    df[const.NEW_CASES_14_DAY_AVG_PER_CAPITA] = (
-        df[const.NEW_CASES_14_DAY_AVG_PER_CAPITA].round(2)
-    )
+    backdated = (df[DATE] == pd.to_datetime('2021-05-27')).to_numpy()
+
+    def by_entry(col):
+        packed = np.full(dense.rows.shape, np.nan)
+        packed[i, j] = df[col].to_numpy('float', na_value=np.nan)
+        change = calc.daily_change(packed)
+        change[i[backdated], j[backdated]] = 0
+        return change[i, j], calc.rolling_mean(change, 14)[i, j].round(2)
+
+    df[const.NEW_CASES], df[const.NEW_CASES_14_DAY_AVG] = by_entry(CASES)
+    _, df[const.NEW_CASES_14_DAY_AVG_PER_CAPITA] = by_entry(CASE_RATE)
+    df = df[[
+        const.DATE,
+        const.AREA,
+        const.CASES,
+        const.CASES_PER_CAPITA,
+        const.CF_OUTBREAK,
+        const.NEW_CASES,
+        const.NEW_CASES_14_DAY_AVG,
+        const.NEW_CASES_14_DAY_AVG_PER_CAPITA,
+    ]]
     return df.convert_dtypes()
 
 
-SPA_NUMBERS = {
-    const.SPA_AV: 1,
-    const.SPA_SF: 2,
-    const.SPA_SG: 3,
-    const.SPA_M: 4,
-    const.SPA_W: 5,
-    const.SPA_S: 6,
-    const.SPA_E: 7,
-    const.SPA_SB: 8,
-}
-
-
 def create_by_region(
         df_all_loc: pd.DataFrame,
         exclude_date_area: Optional[Iterable[Tuple[str, str]]] = None
@@ -284,35 +319,31 @@ def create_by_region(
      """
 
     df_all_loc = df_all_loc[[DATE, AREA, CASES]].copy()
-    df_all_loc[REGION] = df_all_loc[AREA].apply(CSA_REGION_MAP.get)
+    df_all_loc[REGION] = registry.area_regions(df_all_loc[AREA])
 
     # Correct erroneous area records by using previous dates
     if exclude_date_area is not None:
-        df_all_loc.loc[
-            df_all_loc.apply(
-                lambda x: ((x[DATE].isoformat()[:10], x[AREA])
-                           in exclude_date_area),
-                axis='columns'),
-            CASES
-        ] = pd.NA
-
-        # Isolate each area with bad data and forward fill cases
-        for area in [x[1] for x in exclude_date_area]:
-            area_cases = df_all_loc.loc[df_all_loc[AREA] == area, CASES]
-            area_cases = area_cases.fillna(method='pad')
-            # Put area cases back into wider area time series
-            df_all_loc.loc[area_cases.index, CASES] = area_cases
-
-    df_region = covid_tools.calc.compute_all_groups(
-        df_all_loc.groupby([DATE, REGION]).sum().reset_index(),
-        DATE, CASES, REGION, const.NEW_CASES,
-        const.NEW_CASES_14_DAY_AVG, const.CASES_PER_CAPITA,
-        const.NEW_CASES_14_DAY_AVG_PER_CAPITA, population.SPA
+        patch = pd.MultiIndex.from_frame(
+            pd.DataFrame(list(exclude_date_area), columns=[DATE, AREA])
+            .astype({DATE: 'datetime64[ns]'})
+        )
+        bad = pd.MultiIndex.from_frame(df_all_loc[[DATE, AREA]]).isin(patch)
+        df_all_loc.loc[bad, CASES] = pd.NA
+
+        # Forward fill cases within each area with bad data
+        bad_areas = df_all_loc[AREA].isin(patch.unique(AREA))
+        df_all_loc.loc[bad_areas, CASES] = (
+            df_all_loc[bad_areas].groupby(AREA, observed=True)[CASES].ffill()
+        )
+
+    df_region = calc.compute_all_groups(
+        df_all_loc[[DATE, REGION, CASES]]
+        .groupby([DATE, REGION], observed=True).sum().reset_index(),
+        DATE, REGION, REGION_COLUMNS, population.SPA
     )
 
-    df_region['spa'] = df_region[REGION].apply(SPA_NUMBERS.get)
-    df_region = df_region.sort_values([DATE, 'spa']).reset_index(drop=True)
-    df_region.drop(columns='spa', inplace=True)
+    # Regions are categorical in service planning area order
+    df_region = df_region.sort_values([DATE, REGION]).reset_index(drop=True)
     return df_region.convert_dtypes()
 
 
@@ -334,24 +365,55 @@ def create_custom_region(df_area: pd.DataFrame,
             returned time series.
     """
 
-    region_pop = 0
-    for area in areas:
-        region_pop += population.CSA[area]
+    return (create_custom_regions(df_area, {REGION: areas})
+            .drop(columns=REGION))
 
-    # Keep only areas from parameter
-    df_custom_region = (
-        df_area.loc[df_area[AREA].isin(areas), [DATE, CASES]]
-        .groupby(DATE).sum().reset_index()
-    )
 
-    return covid_tools.calc.compute_all(
-        df_custom_region, DATE, CASES, const.NEW_CASES,
-        const.NEW_CASES_14_DAY_AVG, const.CASES_PER_CAPITA,
-        const.NEW_CASES_14_DAY_AVG_PER_CAPITA, region_pop
+def create_custom_regions(df_area: pd.DataFrame,
+                          regions: Dict[str, Iterable]) -> pd.DataFrame:
+    """Tallies the cases and case rate of many custom defined regions at once.
+
+    The cases of every area are arranged in a date by area matrix, which a
+        single sparse product with the region membership matrix sums into
+        every region. Case rates use the total population of each region's
+        areas.
+
+    Args:
+        df_area: A time series where each entry has date, area, and case
+            count information.
+        regions: Maps the name of each region to the areas within it.
+
+    Returns:
+        Time series DataFrame with Date, Region, Cases, New cases, New cases
+            14 day average, Case Rate, New cases 14 day average per capita.
+    """
+    unknown = set().union(*regions.values()) - set(population.CSA)
+    if unknown:
+        raise KeyError(f"No population for {', '.join(sorted(unknown))}")
+    dense = calc.to_dense(df_area, DATE, AREA, (CASES,), fill_dates=False)
+    membership = calc.membership_matrix(regions, dense.groups)
+    # Sum the areas reported on each date, as the missing dates are filled
+    # once the areas are summed
+    cases = np.where(dense.rows, np.nan_to_num(dense.values[CASES]), 0)
+    reported = (membership @ dense.rows.T.astype('float')).T > 0
+    region_cases = calc.ffill(
+        np.where(reported, (membership @ cases.T).T, np.nan)
     )
+    populations = (calc.membership_matrix(regions, list(population.CSA))
+                   @ np.array(list(population.CSA.values()), dtype='float'))
+    region_dense = calc.Dense(dense.dates, pd.Index(regions),
+                              {CASES: region_cases}, calc.span(reported))
+    df_regions = calc.to_long(region_dense, DATE, REGION, calc.compute_columns(
+        region_cases, REGION_COLUMNS, populations
+    ))
+    # The matrices are float, so counts are cast back to integers
+    return df_regions.astype({CASES: INT64, const.NEW_CASES: INT64})
 
 
 def health_dept_ts(many_daily_pr, variable):
+    many_daily_pr = _materialize(many_daily_pr)
+    if isinstance(many_daily_pr, PressReleaseStore):
+        return many_daily_pr.health_dept(variable)
     df = pd.DataFrame([x[variable] for x in many_daily_pr])
     df[DATE] = [pd.to_datetime(x[DATE]) for x in many_daily_pr]
     return (
@@ -373,10 +435,11 @@ def aggregate_single_stat(many_daily_pr, variable):
     var_daily_change = AGGREGATE_VAR_NAMES[variable][0]
     var_daily_change_avg = AGGREGATE_VAR_NAMES[variable][1]
     var_daily_change_avg_per_capita = AGGREGATE_VAR_NAMES[variable][2]
+    many_daily_pr = _materialize(many_daily_pr)
 
     df = (health_dept_ts(many_daily_pr, variable).groupby(DATE)
           .sum().reset_index())
-    df[var_daily_change] = [x[var_daily_change] for x in many_daily_pr]
+    df[var_daily_change] = scalar_ts(many_daily_pr)[var_daily_change].to_list()
     df = pd.concat([df, NO_REPORT_DATES[[const.DATE, var_daily_change]]])
 
     return covid_tools.calc.normalize_population(
@@ -389,13 +452,10 @@ def aggregate_single_stat(many_daily_pr, variable):
 
 
 def aggregate_stats(many_daily_pr):
+    many_daily_pr = _materialize(many_daily_pr)
     df_hospital = covid_tools.calc.compute_all(
-        pd.DataFrame({
-            DATE: [pd.to_datetime(x[DATE]) for x in many_daily_pr],
-            const.HOSPITALIZATIONS: [
-                x[const.HOSPITALIZATIONS] for x in many_daily_pr
-            ],
-        }), DATE, const.HOSPITALIZATIONS, const.NEW_HOSPITALIZATIONS,
+        scalar_ts(many_daily_pr)[[DATE, const.HOSPITALIZATIONS]], DATE,
+        const.HOSPITALIZATIONS, const.NEW_HOSPITALIZATIONS,
         const.NEW_HOSPITALIZATIONS_7_DAY_AVG, avg_window=7, ffill_missing=False
     )
     df_cases, df_deaths = [aggregate_single_stat(many_daily_pr, x)
@@ -417,27 +477,347 @@ def aggregate_stats(many_daily_pr):
             .reset_index(drop=True).convert_dtypes())
 
 
-def generate_all_ts(many_daily_pr=None):
-    if many_daily_pr is None and os.path.isfile(TS_CACHE):
-        with open(TS_CACHE, 'rb') as f:
-            return pickle.load(f)
-    df_area = create_by_area(many_daily_pr)
-    all_ts = {
-        # const.AGGREGATE: aggregate_stats(many_daily_pr),
-        const.AGE_GROUP: create_by_age(many_daily_pr),
-        const.GENDER: create_by_gender(many_daily_pr),
-        const.RACE: create_by_race(many_daily_pr),
-        const.AREA: df_area,
-        const.REGION: create_by_region(df_area, BAD_DATE_AREA),
+# Builders of the time series which only depend on the press releases. The
+# region time series is built from the area time series.
+SECTION_BUILDERS = {
+    # const.AGGREGATE: aggregate_stats,
+    const.AGE_GROUP: create_by_age,
+    const.GENDER: create_by_gender,
+    const.RACE: create_by_race,
+    const.AREA: create_by_area,
+}
+SECTIONS = (*SECTION_BUILDERS, const.REGION)
+
+
+def _timed_build(builder, *args):
+    start = time.perf_counter()
+    result = builder(*args)
+    return result, time.perf_counter() - start
+
+
+def _build_all_ts(many_daily_pr, jobs=None):
+    """Builds every time series and prints the wall clock time of each.
+
+    Args:
+        many_daily_pr: Parsed press releases or a PressReleaseStore.
+        jobs: If greater than one, the sections are built concurrently in a
+            pool of this many processes. The region time series is started
+            as soon as the area time series is done.
+    """
+    start = time.perf_counter()
+    if jobs is None or jobs < 2:
+        built = {x: _timed_build(y, many_daily_pr)
+                 for x, y in SECTION_BUILDERS.items()}
+        built[const.REGION] = _timed_build(
+            create_by_region, built[const.AREA][0], BAD_DATE_AREA
+        )
+    else:
+        with ProcessPoolExecutor(jobs) as executor:
+            # Submit the area first since the region waits on it
+            order = (const.AREA,
+                     *(x for x in SECTION_BUILDERS if x != const.AREA))
+            futures = {x: executor.submit(_timed_build, SECTION_BUILDERS[x],
+                                          many_daily_pr)
+                       for x in order}
+            df_area = futures[const.AREA].result()[0]
+            futures[const.REGION] = executor.submit(
+                _timed_build, create_by_region, df_area, BAD_DATE_AREA
+            )
+            built = {x: y.result() for x, y in futures.items()}
+    print(', '.join(f'{x} {built[x][1]:.2f}s' for x in SECTIONS),
+          f'(total {time.perf_counter() - start:.2f}s)')
+    return {x: built[x][0] for x in SECTIONS}
+
+
+def _append_rows(df_cached: pd.DataFrame,
+                 df_window: pd.DataFrame) -> pd.DataFrame:
+    """Appends the rows of a recomputed window dated after the cached rows."""
+    df_new = df_window[df_window[DATE] > df_cached[DATE].max()]
+    categories = {col: dtype for col, dtype in df_cached.dtypes.items()
+                  if isinstance(dtype, pd.CategoricalDtype)}
+    df = pd.concat(
+        [df_cached, df_new.astype({col: dtype for col, dtype
+                                   in df_cached.dtypes.items()
+                                   if col not in categories})],
+        ignore_index=True
+    )
+    # Groups first seen in the window are added to the cached categories
+    for col, dtype in categories.items():
+        if not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = registry.categorical(df[col], dtype)
+    return df
+
+
+def _window_releases(many_daily_pr, start: pd.Timestamp):
+    """The press releases on or after a date."""
+    if isinstance(many_daily_pr, PressReleaseStore):
+        return tuple(many_daily_pr.iter_releases(start))
+    return tuple(x for x in many_daily_pr if pd.to_datetime(x[DATE]) >= start)
+
+
+def append_ts(section: str, df_cached: pd.DataFrame, many_daily_pr,
+              df_area: Optional[pd.DataFrame] = None
+              ) -> Optional[pd.DataFrame]:
+    """Extends one already built time series with newer press releases.
+
+    Daily changes and rolling averages of a new day only depend on the
+        preceding days, so the time series is recomputed over a trailing
+        window of INCREMENTAL_WINDOW days and only the new rows are appended.
+        The earlier press releases must be unchanged since df_cached was
+        built.
+
+    Args:
+        section: A key of the time series, such as const.AGE_GROUP.
+        df_cached: The time series to extend.
+        many_daily_pr: Parsed press releases or a PressReleaseStore,
+            including at least the trailing window before the new days.
+        df_area: The extended area time series, required for the region.
+
+    Returns:
+        The extended time series, or None if a full rebuild is needed
+            because the set of active areas changed.
+    """
+    last_date = df_cached[DATE].max()
+    start = last_date - pd.Timedelta(INCREMENTAL_WINDOW, 'days')
+    if section == const.REGION:
+        return _append_rows(df_cached, create_by_region(
+            df_area[df_area[DATE] >= start], BAD_DATE_AREA
+        ))
+    window_pr = _window_releases(many_daily_pr, start)
+    if pd.to_datetime(window_pr[-1][DATE]) <= last_date:
+        return df_cached
+    df_window = SECTION_BUILDERS[section](window_pr)
+    # A full rebuild keeps only the currently active areas for every date
+    if (section == const.AREA
+            and set(df_window[AREA]) != set(df_cached[AREA])):
+        return None
+    return _append_rows(df_cached, df_window)
+
+
+def append_all_ts(all_ts: Mapping[str, pd.DataFrame],
+                  many_daily_pr) -> Optional[Dict[str, pd.DataFrame]]:
+    """Extends every already built time series with newer press releases.
+        See append_ts.
+
+    Returns:
+        The extended time series, or None if a full rebuild is needed
+            because the set of active areas changed.
+    """
+    df_area = append_ts(const.AREA, all_ts[const.AREA], many_daily_pr)
+    if df_area is None:
+        return None
+    return {
+        x: (df_area if x == const.AREA
+            else append_ts(x, all_ts[x], many_daily_pr, df_area))
+        for x in SECTIONS
     }
-    with open(TS_CACHE, 'wb') as f:
-        pickle.dump(all_ts, f)
+
+
+def _constants(module) -> str:
+    """Represents the upper case module constants, such as corrections or
+        population tables, for hashing.
+    """
+    return repr(sorted(
+        (x, y.to_dict() if isinstance(y, pd.DataFrame) else y)
+        for x, y in vars(module).items() if x.isupper()
+    ))
+
+
+def _inputs_hash() -> str:
+    """Hashes everything besides the press releases the time series are
+        built from.
+    """
+    inputs = (
+        TS_VERSION, _constants(bad_data), _constants(population),
+        registry.AREAS, registry.REGIONS, registry.AGE_GROUPS,
+        registry.GENDERS, registry.RACES, const.hd.HD_CSA_MAP,
+    )
+    return hashlib.sha1(repr(inputs).encode()).hexdigest()
+
+
+def _release_fingerprints(many_daily_pr) -> Dict[str, Any]:
+    """Maps the date of each press release to its fingerprint. A store
+        already holds the fingerprint each press release was parsed with,
+        otherwise the parsed press release is hashed.
+    """
+    if isinstance(many_daily_pr, PressReleaseStore):
+        return many_daily_pr.fingerprints()
+    return {str(x[DATE])[:10]: hashlib.sha1(repr(x).encode()).hexdigest()
+            for x in many_daily_pr}
+
+
+def _only_appended(cached: Dict[str, Any], current: Dict[str, Any]) -> bool:
+    """Checks if the current press releases only add dates after the cached
+        press releases, which are otherwise unchanged.
+    """
+    return (bool(cached)
+            and all(current.get(x) == y for x, y in cached.items())
+            and min(current.keys() - cached.keys()) > max(cached))
+
+
+def _section_path(section: str) -> str:
+    return os.path.join(TS_CACHE_DIR,
+                        f"{section.lower().replace('/', '-')}.pickle")
+
+
+def _load_cache() -> Dict[str, Dict[str, Any]]:
+    """Loads the fingerprint each cached section was built with. Caches from
+        before sections were cached separately are ignored.
+    """
+    if not os.path.isfile(TS_CACHE):
+        return {}
+    with open(TS_CACHE, 'rb') as f:
+        cached = pickle.load(f)
+    if not (isinstance(cached, dict) and cached.keys() == {'sections'}):
+        return {}
+    return cached['sections']
+
+
+def _read_section(section: str) -> Optional[pd.DataFrame]:
+    path = _section_path(section)
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+class TimeSeries(Mapping):
+    """Every time series by section, each computed on first access.
+
+    Each section is pickled to its own file and TS_CACHE records the
+        fingerprint of the inputs each section was built with. On first
+        access a section is loaded if its fingerprint is unchanged, extended
+        if only newer press releases were added, and otherwise built.
+
+    Args:
+        many_daily_pr: Parsed press releases or a PressReleaseStore.
+        incremental: Allows extending cached sections with newer press
+            releases instead of rebuilding them.
+    """
+
+    def __init__(self, many_daily_pr, incremental: bool = False):
+        self.many_daily_pr = _materialize(many_daily_pr)
+        self.incremental = incremental
+        self.fingerprint = {
+            'inputs': _inputs_hash(),
+            'releases': _release_fingerprints(self.many_daily_pr),
+        }
+        self._sections = {}
+        self._rebuilt = set()
+        # Sections may be requested from several threads at once
+        self._lock = threading.RLock()
+
+    def __getitem__(self, section: str) -> pd.DataFrame:
+        if section not in SECTIONS:
+            raise KeyError(section)
+        return self._section(section)
+
+    def _section(self, section: str) -> pd.DataFrame:
+        """Computes a section unless it already has been."""
+        with self._lock:
+            if section not in self._sections:
+                self._sections[section] = self._compute(section)
+        return self._sections[section]
+
+    def __iter__(self):
+        return iter(SECTIONS)
+
+    def __len__(self) -> int:
+        return len(SECTIONS)
+
+    def _reusable(self, section: str) -> Optional[str]:
+        """Whether a cached section is 'current', 'appendable', or neither.
+        """
+        cached = _load_cache().get(section)
+        if (cached is None or cached['inputs'] != self.fingerprint['inputs']
+                or not os.path.isfile(_section_path(section))):
+            return None
+        if cached['releases'] == self.fingerprint['releases']:
+            return 'current'
+        if self.incremental and _only_appended(cached['releases'],
+                                               self.fingerprint['releases']):
+            return 'appendable'
+        return None
+
+    def _compute(self, section: str) -> pd.DataFrame:
+        reusable = self._reusable(section)
+        if reusable == 'current':
+            return _read_section(section)
+        df = None
+        df_area = None
+        if section == const.REGION:
+            df_area = self[const.AREA]
+            # The cached regions were aggregated from the cached areas, so
+            # they can only be extended if the areas were too
+            if const.AREA in self._rebuilt:
+                reusable = None
+        if reusable == 'appendable':
+            df = append_ts(section, _read_section(section),
+                           self.many_daily_pr, df_area)
+        if df is None:
+            self._rebuilt.add(section)
+            df = (create_by_region(df_area, BAD_DATE_AREA)
+                  if section == const.REGION
+                  else SECTION_BUILDERS[section](self.many_daily_pr))
+        self._save({section: df})
+        return df
+
+    def _save(self, sections: Dict[str, pd.DataFrame]):
+        os.makedirs(TS_CACHE_DIR, exist_ok=True)
+        for section, df in sections.items():
+            with open(_section_path(section), 'wb') as f:
+                pickle.dump(df, f)
+        fingerprints = _load_cache()
+        fingerprints.update(dict.fromkeys(sections, self.fingerprint))
+        with open(TS_CACHE, 'wb') as f:
+            pickle.dump({'sections': fingerprints}, f)
+
+    def build_all(self, jobs: Optional[int] = None):
+        """Computes every section. If none of the cached sections can be
+            reused, they are built with _build_all_ts using jobs processes.
+        """
+        if all(self._reusable(x) is None for x in SECTIONS):
+            built = _build_all_ts(self.many_daily_pr, jobs)
+            with self._lock:
+                self._save(built)
+                self._sections.update(built)
+                self._rebuilt.update(built)
+        for section in SECTIONS:
+            self._section(section)
+
+
+def generate_all_ts(many_daily_pr=None, incremental=False, jobs=None):
+    """Time series of every section, computed or loaded on first access.
+
+    Each cached section is stamped with a fingerprint of every press release,
+        the bad_data corrections, the population tables, and TS_VERSION. A
+        cached section is only reused when the fingerprint is unchanged.
+
+    Args:
+        many_daily_pr: Parsed press releases, such as an iterator from
+            access.iter_press_releases, or a PressReleaseStore. If None, the
+            store is brought up to date and built from incrementally.
+        incremental: If the only change since a section was cached is newer
+            press releases, extends the cached section with them instead of
+            rebuilding from the first press release.
+        jobs: If given, every section is computed right away. When no cached
+            section can be reused, the sections are built concurrently in a
+            pool of this many processes.
+
+    Returns:
+        A TimeSeries mapping each section to its time series.
+    """
+    if many_daily_pr is None:
+        many_daily_pr, incremental = access.update_store(), True
+    all_ts = TimeSeries(many_daily_pr, incremental)
+    if jobs is not None and jobs > 1:
+        all_ts.build_all(jobs)
     return all_ts
 
 
 if __name__ == "__main__":
     every_day = access.query_all()
-    last_month = every_day[-30:]
+    last_month = tuple(access.iter_press_releases(sorted(access.PRID)[-30]))
     today = every_day[-1]
 
     # df_summary = aggregate_stats(every_day)
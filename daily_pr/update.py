@@ -32,5 +32,9 @@ def query_date(date=None, json_cache=True, html_cache=True):
           sep='\n')
 
 
-def update_ts():
-    return generate_all_ts(access.query_all(False))
\ No newline at end of file
+def update_ts(fetch_jobs=None, jobs=None, incremental=True):
+    """Updates the parsed press releases and then the time series. The cached
+        time series are only extended if no stored press release changed.
+    """
+    store = access.update_store(fetch_jobs=fetch_jobs, jobs=jobs)
+    return generate_all_ts(store, incremental, jobs)
\ No newline at end of file
@@ -69,12 +69,18 @@ def lookup_many_addresses(many_address_queries: Iterable[str], buffer=25):
             json.dump(ADDRESSES, f)
 
 
-def prep_addresses():
+def prep_addresses(live_page=None):
     """Combines the functionality of lookup_many_addresses, but references all
         address listed on the LACDPH COVID-19 website first. This should be ran
         before geocoding addresses to get the cached versions saved.
+    Args:
+        live_page: The tables from current_stats.query_live. If None, the
+            cached live page is parsed.
+    Returns:
+        A copy of the address cache, mapping each address to its coordinates.
     """
-    live_page = current_stats.query_live(True)
+    if live_page is None:
+        live_page = current_stats.query_live(True)
     addresses = (
         list(live_page[const.NON_RESIDENTIAL][const.ADDRESS])
         + list(live_page[const.EDUCATION][const.ADDRESS])
@@ -86,3 +92,4 @@ def prep_addresses():
     )
     global ADDRESSES
     ADDRESSES = load_addresses_cache()
+    return dict(ADDRESSES)
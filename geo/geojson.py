@@ -0,0 +1,110 @@
+"""Writes countywide statistical area GeoJSON without re-encoding geometry.
+
+The geometry of each area in csa.geojson is encoded to a GeoJSON fragment
+    once and cached on disk. Exports splice these fragments together with
+    the properties of the run, so only the properties are encoded each time.
+"""
+
+import functools
+import json
+import os
+import os.path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+import lac_covid19.artifacts as artifacts
+from lac_covid19.const import JSON_COMPACT
+from lac_covid19.const.columns import AREA
+from lac_covid19.geo.paths import DIR_CACHE, DIR_DATA
+
+CSA_GEOJSON = os.path.join(DIR_DATA, 'csa.geojson')
+# Property of csa.geojson holding the area name
+_NAME_PROPERTY = 'LABEL'
+
+
+def _fragments_path(precision: Optional[int]) -> str:
+    suffix = '' if precision is None else f'-{precision}'
+    return os.path.join(DIR_CACHE, f'csa-geometry{suffix}.json')
+
+
+def _round_coordinates(coordinates, precision: int):
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        return [round(x, precision) for x in coordinates]
+    return [_round_coordinates(x, precision) for x in coordinates]
+
+
+@functools.lru_cache()
+def geometry_fragments(precision: Optional[int] = None
+                       ) -> Dict[str, List[str]]:
+    """Encoded geometry of each area, sorted by area. An area split across
+        several features has a fragment for each.
+    Args:
+        precision: Rounds coordinates to this many decimal places.
+    """
+    path = _fragments_path(precision)
+    if (os.path.isfile(path)
+            and os.path.getmtime(path) >= os.path.getmtime(CSA_GEOJSON)):
+        with open(path) as f:
+            return json.load(f)
+    with open(CSA_GEOJSON) as f:
+        features = json.load(f)['features']
+    fragments = {}
+    for feature in sorted(features,
+                          key=lambda x: x['properties'][_NAME_PROPERTY]):
+        geometry = feature['geometry']
+        if precision is not None and 'coordinates' in (geometry or {}):
+            geometry = {**geometry, 'coordinates': _round_coordinates(
+                geometry['coordinates'], precision
+            )}
+        area = feature['properties'][_NAME_PROPERTY]
+        fragments.setdefault(area, []).append(
+            json.dumps(geometry, separators=JSON_COMPACT)
+        )
+    os.makedirs(DIR_CACHE, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(fragments, f, separators=JSON_COMPACT)
+    return fragments
+
+
+def csa_areas() -> List[str]:
+    """Areas with geometry, sorted."""
+    return list(geometry_fragments())
+
+
+def write_csa_geojson(df: pd.DataFrame, path: str, how: str = 'inner',
+                      precision: Optional[int] = None) -> bool:
+    """Exports the properties of each area with its geometry, like
+        CSA_BLANK.merge(df, on=AREA, how=how).to_file(path, driver='GeoJSON').
+
+    Args:
+        df: One row per area, with the area name in the AREA column.
+        path: The GeoJSON file to write.
+        how: 'inner' to only include areas in df, or 'left' to include every
+            area with geometry, with empty properties for the areas not in df.
+        precision: Rounds coordinates to this many decimal places.
+
+    Returns:
+        Whether the file changed.
+    """
+    if how not in ('inner', 'left'):
+        raise ValueError(how)
+    columns = [x for x in df.columns if x != AREA]
+    records = json.loads(df[columns].to_json(orient='records',
+                                             date_format='iso'))
+    properties = {str(x): y for x, y in zip(df[AREA], records)}
+    blank = dict.fromkeys(columns)
+    features = []
+    for area, geometries in geometry_fragments(precision).items():
+        if area not in properties and how == 'inner':
+            continue
+        encoded = json.dumps({AREA: area, **properties.get(area, blank)},
+                             separators=JSON_COMPACT)
+        features.extend(
+            f'{{"type":"Feature","properties":{encoded},"geometry":{x}}}'
+            for x in geometries
+        )
+    return artifacts.write_bytes(path, (
+        '{"type":"FeatureCollection","features":[\n'
+        + ',\n'.join(features) + '\n]}\n'
+    ).encode())
@@ -1,3 +1,5 @@
 import os.path
 
 DIR_DATA = os.path.join(os.path.dirname(__file__), 'data')
+# Files generated from DIR_DATA, which are not tracked
+DIR_CACHE = os.path.join(os.path.dirname(__file__), 'cache')
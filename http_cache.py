@@ -0,0 +1,64 @@
+"""Conditional requests for webpages cached on disk.
+
+The ETag and Last-Modified headers of a fetched page are saved in a small
+    JSON file next to the cached page. Sending them back lets the server
+    answer 304 Not Modified instead of the whole page.
+"""
+
+import json
+import os
+import os.path
+
+import requests
+
+NOT_MODIFIED = 304
+
+# Response header and the request header which echoes it back
+_VALIDATORS = (('ETag', 'If-None-Match'),
+               ('Last-Modified', 'If-Modified-Since'))
+
+
+def validators_path(page_path):
+    return f'{page_path}.validators.json'
+
+
+def load_validators(page_path):
+    """Reads the validators saved alongside a cached page.
+    Args:
+        page_path: The location of the cached page.
+    Returns:
+        A dictionary of the saved response headers, empty if none are saved.
+    """
+    path = validators_path(page_path)
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_validators(page_path, response):
+    """Saves the validators of a response alongside its cached page."""
+    validators = {x: response.headers[x] for x, _ in _VALIDATORS
+                  if x in response.headers}
+    path = validators_path(page_path)
+    if validators:
+        with open(path, 'w') as f:
+            json.dump(validators, f)
+    elif os.path.isfile(path):
+        os.remove(path)
+
+
+def conditional_get(url, validators, session=None, **kwargs):
+    """Requests a page only if it changed since the validators were saved.
+    Args:
+        url: The page to request.
+        validators: Saved response headers from load_validators. These should
+            only be sent if the page they came from is still cached.
+        session: An optional requests session to send the request with.
+    Returns:
+        The response, which has a status of NOT_MODIFIED if the cached page
+        is current.
+    """
+    headers = {request: validators[response]
+               for response, request in _VALIDATORS if response in validators}
+    return (session or requests).get(url, headers=headers, **kwargs)
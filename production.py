@@ -1,18 +1,29 @@
-import math
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import hashlib
+import io
+import json
+import os
 import os.path
 import re
 from datetime import date
 
 import pandas as pd
 
+import lac_covid19.artifacts as artifacts
 import lac_covid19.const as const
 from lac_covid19.daily_pr.update import query_date, update_ts
 from lac_covid19.current_stats.scrape import query_live
 from lac_covid19.current_stats.citations import CITATIONS
-from lac_covid19.population import CSA as CSA_POPULATION
 from lac_covid19.daily_pr.time_series import generate_all_ts
-from lac_covid19.geo.csa import CSA_BLANK, CSA_REGION_MAP, CSA_OBJECTID_MAP
+import lac_covid19.daily_pr.time_series as time_series
+from lac_covid19.daily_pr.cube import CUBE_INDEX_PATH, CUBE_PATH, Cube
+import lac_covid19.dag as dag
+from lac_covid19.dag import Task
+from lac_covid19.geo.csa import CSA_OBJECTID_MAP
 import lac_covid19.geo.geocoder as geocoder
+import lac_covid19.geo.geojson as geojson
+import lac_covid19.registry as registry
 
 tz_offset = pd.to_timedelta(7, unit='hours')
 
@@ -21,6 +32,19 @@ DIR_DOCS, DIR_EXPORT = [os.path.join(os.path.dirname(__file__), x)
 DIR_ARCGIS_UPLOAD, DIR_ARCGIS_APPEND = [os.path.join(DIR_EXPORT, f'arcgis-{x}')
                                         for x in ('upload', 'append')]
 DIR_TS, DIR_LIVE = [os.path.join(DIR_DOCS, x) for x in ('time-series', 'live')]
+DIR_CSA_CHUNKS = os.path.join(DIR_ARCGIS_UPLOAD, 'csa-ts')
+CSA_MANIFEST = os.path.join(DIR_ARCGIS_UPLOAD, 'csa-ts-manifest.json')
+# Most rows ArcGIS accepts in one upload
+ARCGIS_MAX_ROWS = 50_000
+# Time series as of the last uploaded append file, which append files are
+# diffed with, and as of the append file waiting to be uploaded
+DIR_ARCGIS_SNAPSHOT = os.path.join(DIR_EXPORT, 'arcgis-snapshot')
+DIR_ARCGIS_PENDING = os.path.join(DIR_ARCGIS_SNAPSHOT, 'pending')
+# Hashes of the inputs and files of each publish step
+PUBLISH_STATE = os.path.join(DIR_EXPORT, 'publish-state.json')
+# Live page tables exported as is
+LIVE_EXPORTS = (const.CSA_TOTAL, const.RESIDENTIAL, const.NON_RESIDENTIAL,
+                const.HOMELESS, const.EDUCATION)
 
 
 def datetime_input(obj):
@@ -31,6 +55,80 @@ def datetime_input(obj):
     return pd.to_datetime(date.today())
 
 
+def _as_uploaded(df):
+    """The values of a DataFrame as text, exactly as written to a CSV."""
+    return pd.read_csv(io.StringIO(df.to_csv(index=False)), dtype='str',
+                       keep_default_na=False)
+
+
+def append_delta(df, keys, snapshot_path):
+    """Selects the rows which are new or changed since the snapshot.
+    Args:
+        df: A time series.
+        keys: The columns identifying a row, such as date and area.
+        snapshot_path: A CSV of the time series the last uploaded append was
+            made from.
+    Returns:
+        The inserted and updated rows of df, or None if there is no snapshot
+            with the same columns to compare with.
+    """
+    if not os.path.isfile(snapshot_path):
+        return None
+    previous = pd.read_csv(snapshot_path, dtype='str', keep_default_na=False)
+    if list(previous.columns) != list(df.columns):
+        print(f'Columns changed since the snapshot {snapshot_path}')
+        return None
+    current = _as_uploaded(df)
+    merged = current.merge(previous, 'left', on=list(keys),
+                           suffixes=('', ' previous'), indicator=True)
+    changed = merged['_merge'] == 'left_only'
+    for col in df.columns.drop(list(keys)):
+        changed |= merged[col] != merged[f'{col} previous']
+    return df[changed.to_numpy()]
+
+
+def arcgis_append(df, filename, keys, append_date=None):
+    """Writes an append file of the rows inserted or updated since the last
+        uploaded append file. The time series is saved as the pending
+        snapshot, which replaces the snapshot once confirm_arcgis_appends is
+        called after uploading. Until then, every append file is diffed with
+        the last uploaded snapshot, so it holds every change not yet uploaded.
+    Args:
+        append_date: Without a snapshot, the append file has every row on or
+            after this date instead.
+    """
+    df_append = append_delta(df, keys,
+                             os.path.join(DIR_ARCGIS_SNAPSHOT, filename))
+    if df_append is None:
+        df_append = df[df[const.DATE]>=datetime_input(append_date)]
+    df_append = df_append.copy()
+    # Correct for ArcGIS append timezone change
+    df_append[const.DATE] = df_append[const.DATE] + tz_offset
+    artifacts.to_csv(df_append, os.path.join(DIR_ARCGIS_APPEND, filename),
+                     index=False)
+    os.makedirs(DIR_ARCGIS_PENDING, exist_ok=True)
+    artifacts.to_csv(df, os.path.join(DIR_ARCGIS_PENDING, filename),
+                     index=False)
+    return df_append
+
+
+def confirm_arcgis_appends(*filenames):
+    """Marks append files as uploaded, so the next append files are diffed
+        with the time series they were made from.
+    Args:
+        filenames: The append files which were uploaded. If none are given,
+            every pending append file is confirmed.
+    """
+    if not os.path.isdir(DIR_ARCGIS_PENDING):
+        return
+    for filename in filenames or sorted(os.listdir(DIR_ARCGIS_PENDING)):
+        pending = os.path.join(DIR_ARCGIS_PENDING, filename)
+        if os.path.isfile(pending):
+            artifacts.replace(pending,
+                              os.path.join(DIR_ARCGIS_SNAPSHOT, filename))
+            print(f'Confirmed upload of {filename}')
+
+
 def choropleth_colors(df_area_day, col, lower, upper):
     if df_area_day is None:
         df_area_day = generate_all_ts()[const.AREA]
@@ -53,9 +151,8 @@ def area_data(df_area_live, df_area_ts): #, lower=0.05, upper=0.95):
     df_area = (df_area[df_area[const.AREA]!=const.LOS_ANGELES]
                .reset_index(drop=True).copy())
     # Add region and population data
-    df_area[const.REGION] = (df_area[const.AREA].apply(CSA_REGION_MAP.get)
-                             .convert_dtypes())
-    df_area[const.POPULATION] = df_area[const.AREA].apply(CSA_POPULATION.get)
+    df_area[const.REGION] = registry.area_regions(df_area[const.AREA])
+    df_area[const.POPULATION] = registry.area_populations(df_area[const.AREA])
     # Reorder columns and export
     df_area = df_area[
         [const.AREA, const.REGION, const.POPULATION, const.CF_OUTBREAK,
@@ -63,26 +160,26 @@ def area_data(df_area_live, df_area_ts): #, lower=0.05, upper=0.95):
          const.NEW_CASES_14_DAY_AVG, const.NEW_CASES_14_DAY_AVG_PER_CAPITA,
          const.DEATHS, const.DEATH_RATE]
     ]
-    df_area.to_csv(os.path.join(DIR_LIVE, 'area.csv'), index=False)
+    artifacts.to_csv(df_area, os.path.join(DIR_LIVE, 'area.csv'),
+                     index=False)
     return df_area
 
 
-def arcgis_map(df_area, lower=0.05, upper=0.95):
-    df_geo = CSA_BLANK.merge(df_area, on=const.AREA)
-    # Fix GeoPandas GeoJSON driver unable to handle Float64
-    for col in(const.NEW_CASES_14_DAY_AVG,
-               const.NEW_CASES_14_DAY_AVG_PER_CAPITA):
-        df_geo[col] = df_geo[col].astype('float')
+def arcgis_map(df_area, lower=0.05, upper=0.95, precision=None):
+    df_geo = df_area[df_area[const.AREA].isin(geojson.csa_areas())]
     # Put area data into a geojson
     filename = 'csa-live-map'
-    df_geo.to_file(os.path.join(DIR_ARCGIS_UPLOAD, f'{filename}.geojson'),
-               driver='GeoJSON')
+    geojson.write_csa_geojson(
+        df_geo, os.path.join(DIR_ARCGIS_UPLOAD, f'{filename}.geojson'),
+        precision=precision
+    )
     # Create append file
     df_append = df_area.copy()
     df_append[const.OBJECTID] = df_append[const.AREA].apply(CSA_OBJECTID_MAP.get)
     df_append = df_append.drop(columns=[const.AREA, const.REGION,
                                         const.POPULATION, const.CF_OUTBREAK])
-    df_append.to_csv(os.path.join(DIR_ARCGIS_APPEND, f'{filename}.csv'),
+    artifacts.to_csv(df_append,
+                     os.path.join(DIR_ARCGIS_APPEND, f'{filename}.csv'),
                      index=False)
 
     # Choropleth suggestions
@@ -95,89 +192,126 @@ def arcgis_map(df_area, lower=0.05, upper=0.95):
 
 
 def arcgis_live_vaccinated(df_vaccinated):
-    df = CSA_BLANK.merge(df_vaccinated, on=const.AREA)
-    df = df.drop(columns=[const.VACCINATED_PEOPLE, const.VACCINATED_PERCENT])
+    df = df_vaccinated.drop(columns=[const.VACCINATED_PEOPLE,
+                                     const.VACCINATED_PERCENT])
     filename = 'csa-vaccinated'
-    df.to_file(os.path.join(DIR_ARCGIS_UPLOAD, f'{filename}.geojson'),
-               driver='GeoJSON')
+    geojson.write_csa_geojson(
+        df, os.path.join(DIR_ARCGIS_UPLOAD, f'{filename}.geojson')
+    )
 
 
 def arcgis_live_map_version_two(df_area, df_vaccinated):
-    df = CSA_BLANK.merge(df_vaccinated, on=const.AREA, how='left')
     # df = CSA_BLANK.merge(pd.merge(df_area, df_vaccinated, on=const.AREA), on=const.AREA)
     filename = 'csa-vaccinated'
-    df.to_file(os.path.join(DIR_ARCGIS_UPLOAD, f'{filename}.geojson'),
-               driver='GeoJSON')
+    geojson.write_csa_geojson(
+        df_vaccinated, os.path.join(DIR_ARCGIS_UPLOAD, f'{filename}.geojson'),
+        how='left'
+    )
 
 
 
-def arcgis_csa_days_back(df_area):
-    reporting_areas = len(df_area[const.AREA].unique())
-    days_back = math.ceil(50_000 / reporting_areas)
-    return df_area[const.DATE].max() - pd.Timedelta(days_back, 'days')
+def csa_chunks(df_area, max_rows=ARCGIS_MAX_ROWS):
+    """Partitions a time series into date ranges of at most max_rows rows.
+        Ranges are a fixed number of days counted from the first date, so
+        the earlier chunks stay the same as days are added.
+    Returns:
+        The first date, last date and rows of each chunk.
+    """
+    rows_per_day = df_area.groupby(const.DATE).size()
+    days = max_rows // rows_per_day.max()
+    if not days:
+        raise ValueError(f'A single day has over {max_rows} rows')
+    first = rows_per_day.index.min()
+    chunk = (df_area[const.DATE] - first).dt.days // days
+    return [(x[const.DATE].min(), x[const.DATE].max(), x)
+            for _, x in df_area.groupby(chunk)]
+
+
+def _write_chunk(chunk):
+    start, end, df = chunk
+    filename = f'csa-ts-{start:%Y-%m-%d}-{end:%Y-%m-%d}.csv'
+    data = df.to_csv(index=False).encode()
+    artifacts.write_bytes(os.path.join(DIR_CSA_CHUNKS, filename), data)
+    return {'file': filename, 'start': f'{start:%Y-%m-%d}',
+            'end': f'{end:%Y-%m-%d}', 'rows': len(df),
+            'sha1': hashlib.sha1(data).hexdigest()}
+
+
+def export_csa_chunks(df_area, max_rows=ARCGIS_MAX_ROWS, jobs=None):
+    """Writes the whole time series as chunks which each fit in one upload,
+        and a manifest listing the chunks in date order. Chunks which are no
+        longer part of the series are removed.
+    Args:
+        jobs: The number of chunks serialized at once.
+    Returns:
+        The manifest.
+    """
+    os.makedirs(DIR_CSA_CHUNKS, exist_ok=True)
+    with ThreadPoolExecutor(jobs) as executor:
+        chunks = list(executor.map(_write_chunk,
+                                   csa_chunks(df_area, max_rows)))
+    current = {x['file'] for x in chunks}
+    for filename in sorted(os.listdir(DIR_CSA_CHUNKS)):
+        if filename.endswith('.csv') and filename not in current:
+            artifacts.remove(os.path.join(DIR_CSA_CHUNKS, filename))
+    manifest = {'max rows': max_rows, 'rows': len(df_area),
+                'chunks': chunks}
+    artifacts.write_bytes(CSA_MANIFEST,
+                          json.dumps(manifest, indent=2).encode())
+    return manifest
 
 
 def arcgis_csa_ts(df_area, append_date=None):
     df_area = df_area.loc[
-        ((df_area[const.AREA] != const.LOS_ANGELES)
-         & (df_area[const.DATE] >= arcgis_csa_days_back(df_area))),
+        df_area[const.AREA] != const.LOS_ANGELES,
         [const.DATE, const.AREA, const.CASES, const.NEW_CASES]
     ].copy()
-    df_area[const.REGION] = df_area[const.AREA].apply(CSA_REGION_MAP.get)
+    df_area[const.REGION] = registry.area_regions(df_area[const.AREA])
     df_area = df_area[[const.DATE, const.AREA, const.REGION,
                        const.CASES, const.NEW_CASES]]
-    filename = 'csa-ts.csv'
-    df_area.to_csv(os.path.join(DIR_ARCGIS_UPLOAD, filename), index=False)
+    export_csa_chunks(df_area)
     if append_date is not None:
-        df_area = df_area[df_area[const.DATE]>=datetime_input(append_date)]
-        # Correct for ArcGIS append timezone change
-        df_area[const.DATE] = df_area[const.DATE].apply(lambda x: x + tz_offset)
-        df_area.to_csv(os.path.join(DIR_ARCGIS_APPEND, filename), index=False)
+        arcgis_append(df_area, 'csa-ts.csv', (const.DATE, const.AREA),
+                      append_date)
 
 
 def arcgis_region_ts(df_region, append_date=None):
     filename = 'region-ts.csv'
-    df_region.to_csv(os.path.join(DIR_ARCGIS_UPLOAD, filename), index=False)
+    artifacts.to_csv(df_region, os.path.join(DIR_ARCGIS_UPLOAD, filename),
+                     index=False)
     if append_date is not None:
-        df_region = df_region[
-            df_region[const.DATE]>=datetime_input(append_date)
-        ].copy()
-        # Correct for ArcGIS append timezone change
-        df_region[const.DATE] = df_region[const.DATE].apply(
-            lambda x: x + tz_offset
-        )
-        df_region.to_csv(os.path.join(DIR_ARCGIS_APPEND, filename), index=False)
+        arcgis_append(df_region, filename, (const.DATE, const.REGION),
+                      append_date)
 
 
 def arcgis_aggregate_ts(df_aggregate, append_date=None):
     filename = 'aggregate-ts.csv'
-    df_aggregate.to_csv(os.path.join(DIR_ARCGIS_UPLOAD, filename), index=False)
+    artifacts.to_csv(df_aggregate, os.path.join(DIR_ARCGIS_UPLOAD, filename),
+                     index=False)
     if append_date is not None:
-        df_aggregate = df_aggregate[
-            df_aggregate[const.DATE]>=datetime_input(append_date)
-        ].copy()
-        df_aggregate[const.DATE] = df_aggregate[const.DATE].apply(
-            lambda x: x+tz_offset
-        )
-        df_aggregate.to_csv(os.path.join(DIR_ARCGIS_APPEND, filename),
-                            index=False)
+        arcgis_append(df_aggregate, filename, (const.DATE,), append_date)
 
 
 def arcgis_region_snapshot(df_region):
-    df_region.loc[
-        df_region[const.DATE]==df_region[const.DATE].max(),
-        [const.REGION, const.CASES_PER_CAPITA,
-         const.NEW_CASES_14_DAY_AVG_PER_CAPITA]
-    ].to_csv(os.path.join(DIR_ARCGIS_UPLOAD, 'regions-snapshot.csv'),
-             index=False)
+    artifacts.to_csv(
+        df_region.loc[
+            df_region[const.DATE]==df_region[const.DATE].max(),
+            [const.REGION, const.CASES_PER_CAPITA,
+             const.NEW_CASES_14_DAY_AVG_PER_CAPITA]
+        ],
+        os.path.join(DIR_ARCGIS_UPLOAD, 'regions-snapshot.csv'), index=False
+    )
 
 
 def arcgis_age_snapshot(df_age):
-    df_age.loc[
-        df_age[const.DATE]==df_age[const.DATE].max(),
-        [const.AGE_GROUP, const.CASES_PER_CAPITA,
-         const.NEW_CASES_14_DAY_AVG_PER_CAPITA]
-    ].to_csv(os.path.join(DIR_ARCGIS_UPLOAD, 'age-groups-snapshot.csv'))
+    artifacts.to_csv(
+        df_age.loc[
+            df_age[const.DATE]==df_age[const.DATE].max(),
+            [const.AGE_GROUP, const.CASES_PER_CAPITA,
+             const.NEW_CASES_14_DAY_AVG_PER_CAPITA]
+        ],
+        os.path.join(DIR_ARCGIS_UPLOAD, 'age-groups-snapshot.csv')
+    )
 
 
 def apply_coordinates(df):
@@ -189,7 +323,8 @@ def apply_coordinates(df):
 
 
 def arcgis_live_non_res(df_non_res):
-    apply_coordinates(df_non_res).to_csv(
+    artifacts.to_csv(
+        apply_coordinates(df_non_res),
         os.path.join(DIR_ARCGIS_UPLOAD, 'non-residential-outbreaks.csv'),
         index=False)
 
@@ -199,7 +334,8 @@ def arcgis_live_edu(df_education):
         df_education[const.ADDRESS].apply(lambda x: x.upper())
         != 'LOS ANGELES, CA'
     ]
-    apply_coordinates(df_education).to_csv(
+    artifacts.to_csv(
+        apply_coordinates(df_education),
         os.path.join(DIR_ARCGIS_UPLOAD, 'education-outbreaks.csv'), index=False)
 
 
@@ -215,56 +351,138 @@ def arcgis_citations():
         lambda x: citation_counts.loc[(x[const.NAME], x[const.ADDRESS])],
         axis='columns'
     )
-    apply_coordinates(df).to_csv(
+    artifacts.to_csv(
+        apply_coordinates(df),
         os.path.join(DIR_ARCGIS_UPLOAD, 'citations.csv'), index=False
     )
 
 
 def export_time_series(ts_dict):
     for key in ts_dict:
-        filename = f"{key.lower().replace('/', '-')}-ts.csv"
-        ts_dict[key].to_csv(os.path.join(DIR_TS, filename), index=False)
+        artifacts.to_csv(ts_dict[key], _ts_path(key), index=False)
 
 
 def export_live(live_dict):
     for key in live_dict:
         if key != const.AREA:
-            filename = f"{key.lower().replace(' ', '-')}.csv"
-            live_dict[key].to_csv(os.path.join(DIR_LIVE, filename),
-                                  index=False)
-
+            artifacts.to_csv(live_dict[key], _live_path(key), index=False)
 
-def publish(date_=None, update_live=True, ts_cache=False, live_cache=False):
 
-    df_area_live = None
+def _ts_path(key):
+    return os.path.join(DIR_TS, f"{key.lower().replace('/', '-')}-ts.csv")
 
-    if update_live:
-        live_dict = query_live(live_cache)
-        export_live(live_dict)
-        df_area_live = live_dict[const.AREA]
-        geocoder.prep_addresses()
-        arcgis_live_non_res(live_dict[const.NON_RESIDENTIAL])
-        arcgis_live_edu(live_dict[const.EDUCATION])
 
-    arcgis_citations()
+def _live_path(key):
+    return os.path.join(DIR_LIVE, f"{key.lower().replace(' ', '-')}.csv")
 
-    if ts_cache:
-        ts_dict = generate_all_ts()
-    else:
-        ts_dict = update_ts()
-        export_time_series(ts_dict)
 
+def publish_tasks(date_=None, *, update_live=True, ts_cache=False,
+                  live_cache=False, live_dict=None, jobs=None):
+    """Expresses publishing as a graph of dag.Task.
+    Args:
+        live_dict: Already queried live page tables, to use instead of
+            querying the live page.
+        jobs: The number of processes the time series are built with.
+    """
     if date_ is None:
         date_ = date.today()
-
-    df_area_ts = ts_dict[const.AREA]
-    df_area = area_data(df_area_live, df_area_ts)
-    arcgis_map(df_area)
-    arcgis_csa_ts(ts_dict[const.AREA], date_)
-    # arcgis_region_ts(ts_dict[const.REGION], date)
-    # arcgis_aggregate_ts(ts_dict[const.AGGREGATE], date_)
-    arcgis_region_snapshot(ts_dict[const.REGION])
-    arcgis_age_snapshot(ts_dict[const.AGE_GROUP])
+    upload = partial(os.path.join, DIR_ARCGIS_UPLOAD)
+    append = partial(os.path.join, DIR_ARCGIS_APPEND)
+    tasks = {
+        'date': Task(lambda: date_),
+        'ts': Task(generate_all_ts if ts_cache
+                   else partial(update_ts, jobs=jobs)),
+        'area ts': Task(lambda ts: ts[const.AREA], ('ts',)),
+        'cube': Task(Cube.from_area_ts, ('area ts',),
+                     (CUBE_PATH, CUBE_INDEX_PATH)),
+        'csa ts': Task(arcgis_csa_ts, ('area ts', 'date'),
+                       (DIR_CSA_CHUNKS, CSA_MANIFEST, append('csa-ts.csv'),
+                        os.path.join(DIR_ARCGIS_PENDING, 'csa-ts.csv'),
+                        # Rerun once the append file is uploaded
+                        os.path.join(DIR_ARCGIS_SNAPSHOT, 'csa-ts.csv'))),
+        'region ts': Task(lambda ts: ts[const.REGION], ('ts',)),
+        'age ts': Task(lambda ts: ts[const.AGE_GROUP], ('ts',)),
+        'region snapshot': Task(arcgis_region_snapshot, ('region ts',),
+                                (upload('regions-snapshot.csv'),)),
+        'age snapshot': Task(arcgis_age_snapshot, ('age ts',),
+                             (upload('age-groups-snapshot.csv'),)),
+    }
+    if not ts_cache:
+        tasks['export ts'] = Task(
+            export_time_series, ('ts',),
+            tuple(_ts_path(x) for x in time_series.SECTIONS)
+        )
+    if update_live:
+        tasks.update({
+            'live': Task(lambda: (query_live(live_cache) if live_dict is None
+                                  else live_dict)),
+            'export live': Task(
+                export_live, ('live',),
+                tuple(_live_path(x) for x in LIVE_EXPORTS)
+            ),
+            # Cache the coordinates of every address before geocoding. The
+            # cache is an input of the geocoded exports, so they are rerun
+            # when a coordinate changes.
+            'addresses': Task(geocoder.prep_addresses, ('live',)),
+            'non-residential': Task(
+                lambda _, live: arcgis_live_non_res(
+                    live[const.NON_RESIDENTIAL]
+                ),
+                ('addresses', 'live'),
+                (upload('non-residential-outbreaks.csv'),)
+            ),
+            'education': Task(
+                lambda _, live: arcgis_live_edu(live[const.EDUCATION]),
+                ('addresses', 'live'), (upload('education-outbreaks.csv'),)
+            ),
+            'area': Task(lambda live, df_area_ts: area_data(live[const.AREA],
+                                                            df_area_ts),
+                         ('live', 'area ts'),
+                         (os.path.join(DIR_LIVE, 'area.csv'),)),
+            'map': Task(arcgis_map, ('area',),
+                        (upload('csa-live-map.geojson'),
+                         append('csa-live-map.csv'))),
+        })
+    tasks['citation records'] = Task(lambda: CITATIONS)
+    tasks['citations'] = Task(
+        lambda *_: arcgis_citations(),
+        ('citation records', *(('addresses',) if update_live else ())),
+        (upload('citations.csv'),)
+    )
+    return tasks
+
+
+def publish(date_=None, *, update_live=True, ts_cache=False,
+            live_cache=False, if_modified=False, jobs=None):
+    """Exports every dataset.
+
+    The steps run as a task graph, so the live page scrape and geocoding
+        overlap with building the time series. Exports whose inputs and files
+        are unchanged since the last publish are skipped.
+    Args:
+        if_modified: When requesting the live page online, skip publishing
+            entirely if the page has not changed since it was last fetched.
+        jobs: The maximum number of steps run at once. Use 1 to run them one
+            at a time.
+    Returns:
+        The exported files which changed. Files are only rewritten when
+            their content changes.
+    """
+    live_dict = None
+    if update_live and if_modified:
+        live_dict = query_live(live_cache, if_modified)
+        if live_dict is None:
+            print('Live page unchanged, nothing to publish')
+            return []
+    artifacts.take_changed()
+    dag.run(
+        publish_tasks(date_, update_live=update_live, ts_cache=ts_cache,
+                      live_cache=live_cache, live_dict=live_dict, jobs=jobs),
+        jobs, PUBLISH_STATE
+    )
+    changed = artifacts.take_changed()
+    print(f'{len(changed)} files changed', *changed, sep='\n\t')
+    return changed
 
 
 if __name__ == "__main__":
@@ -0,0 +1,91 @@
+"""Canonical areas, regions, and demographic groups with stable codes.
+
+Each kind of identifier has an ordered pd.CategoricalDtype whose categories
+    are the registered names in their display order. Series of identifiers
+    are stored as category codes, so sorting follows the display order and
+    looking up the region or population of an area indexes an array by code.
+"""
+
+import json
+import logging
+import os.path
+
+import numpy as np
+import pandas as pd
+
+import lac_covid19.const as const
+import lac_covid19.population as population
+from lac_covid19.geo.paths import DIR_DATA
+
+with open(os.path.join(DIR_DATA, 'csa-region-map.json')) as f:
+    _CSA_REGION_MAP = json.load(f)
+
+AREAS = tuple(sorted(
+    set(population.CSA) | set(_CSA_REGION_MAP)
+    | {const.LOS_ANGELES, const.hd.CSA_LB, const.hd.CSA_PAS}
+))
+# Ordered by service planning area number
+REGIONS = (const.SPA_AV, const.SPA_SF, const.SPA_SG, const.SPA_M,
+           const.SPA_W, const.SPA_S, const.SPA_E, const.SPA_SB)
+# The age groups reported before and after July 24, 2020, youngest first
+AGE_GROUPS = (
+    const.AGE_0_17, const.AGE_18_40, const.AGE_41_65, const.AGE_OVER_65,
+    const.AGE_0_4, const.AGE_5_11, const.AGE_12_17, const.AGE_18_29,
+    const.AGE_30_49, const.AGE_50_64, const.AGE_65_79, const.AGE_OVER_80,
+)
+GENDERS = tuple(sorted(const.GENDER_GROUP))
+RACES = tuple(sorted(const.RACE_GROUP))
+
+AREA_DTYPE, REGION_DTYPE, AGE_DTYPE, GENDER_DTYPE, RACE_DTYPE = [
+    pd.CategoricalDtype(x, ordered=True)
+    for x in (AREAS, REGIONS, AGE_GROUPS, GENDERS, RACES)
+]
+
+# Indexed by area code
+_REGION_CODES = np.array([
+    REGIONS.index(_CSA_REGION_MAP[x]) if x in _CSA_REGION_MAP else -1
+    for x in AREAS
+])
+_POPULATIONS = np.array([population.CSA.get(x, np.nan) for x in AREAS],
+                        dtype='float')
+_logger = logging.getLogger(__name__)
+
+
+def categorical(values, dtype: pd.CategoricalDtype) -> pd.Categorical:
+    """Encodes identifiers with a registered dtype.
+
+    If some identifiers are not registered, no values are lost: they are
+        added to the categories, which are then sorted alphabetically.
+    """
+    values = pd.Series(values, copy=False)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        unknown = set(values.cat.categories) - set(dtype.categories)
+    else:
+        unknown = set(values.dropna().unique()) - set(dtype.categories)
+    if unknown:
+        _logger.info('Unregistered: %s', ', '.join(sorted(unknown)))
+        dtype = pd.CategoricalDtype(
+            sorted((*dtype.categories, *unknown)), ordered=True
+        )
+    return pd.Categorical(values, dtype=dtype)
+
+
+def _area_codes(areas) -> np.ndarray:
+    """Codes of registered areas, -1 for any other area."""
+    return pd.Categorical(pd.Series(areas, copy=False),
+                          dtype=AREA_DTYPE).codes.astype('int')
+
+
+def area_regions(areas) -> pd.Categorical:
+    """Looks up the region of each area. Areas without a region are missing.
+    """
+    codes = _area_codes(areas)
+    return pd.Categorical.from_codes(
+        np.where(codes >= 0, _REGION_CODES[codes], -1), dtype=REGION_DTYPE
+    )
+
+
+def area_populations(areas) -> np.ndarray:
+    """Looks up the population of each area. Unknown areas are NaN."""
+    codes = _area_codes(areas)
+    return np.where(codes >= 0, _POPULATIONS[codes], np.nan)